@@ -12,9 +12,27 @@ class AssistantRequestDTO(BaseModel):
     correctAnswer: int
     options: list[str]
     situation: Literal['wrong_evidence', 'wrong_answer', 'stuck']
+    # Answer with the local hint if the model has not answered within this many milliseconds
+    latencyBudgetMs: int | None = None
+
+
+class AssistantProblemRequestDTO(BaseModel):
+    """
+    Request DTO for a suggestion on a stored problem: the passage, evidence and options are loaded server-side
+    and only the sentences around the evidence and the selection go into the prompt
+    """
+    problemId: int
+    problemType: Literal['evidence', 'flashlight']
+    userSelectedText: str = ""
+    userAnswer: int | None = None
+    situation: Literal['wrong_evidence', 'wrong_answer', 'stuck']
+    latencyBudgetMs: int | None = None
 
 
 class AssistantResponseDTO(BaseModel):
     """Response DTO for AI assistant suggestion"""
     suggestion: str
     emotion: Literal['idle', 'thinking', 'explaining', 'celebrating', 'concerned']
+    # llm: answered by the model, cache: a model answer given before, local: built by the local hint engine,
+    # fallback: canned message
+    source: Literal['llm', 'cache', 'local', 'fallback']
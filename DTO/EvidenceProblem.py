@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
@@ -11,10 +13,32 @@ class EvidenceProblemDTO(BaseModel):
 class EvidenceProblemResponseDTO(BaseModel):
     id: int
     problem_statement: str
-    reading_content: str
+    reading_content_id: int
+    # Left out when the caller asked for include_passage=false
+    reading_content: str | None = None
     evidence: str
     options: list[str]
     correct_option: int
+    # Only filled in for an authenticated caller who asked for it
+    solved: bool | None = None
 
     class Config:
         from_attributes = True
+
+
+class EvidenceGradeDTO(BaseModel):
+    problem_id: int
+    # Character offsets of the highlight in the passage, end exclusive
+    start: int
+    end: int
+
+class EvidenceGradeResponseDTO(BaseModel):
+    problem_id: int
+    # exact: the highlight covers the evidence's words and no others, overlap: it shares some of them, miss: none
+    verdict: Literal['exact', 'overlap', 'miss']
+    # F1 of the highlighted words against the evidence's words
+    score: float
+    precision: float
+    recall: float
+    # The evidence's character span in the passage
+    evidence_span: list[int] | None = None
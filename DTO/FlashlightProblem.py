@@ -10,7 +10,31 @@ class FlashlightProblemResponseDTO(BaseModel):
     id: int
     problem_statement: str
     target: str
-    reading_content: str
+    reading_content_id: int
+    # Left out when the caller asked for include_passage=false
+    reading_content: str | None = None
+    # Only filled in for an authenticated caller who asked for it
+    solved: bool | None = None
 
     class Config:
         from_attributes = True
+
+
+class FlashlightGradeDTO(BaseModel):
+    problem_id: int
+    # Character offsets of the highlight in the passage, end exclusive
+    start: int
+    end: int
+    # Measured by the client, so the time limit it is checked against is advisory
+    elapsed_ms: int
+
+class FlashlightGradeResponseDTO(BaseModel):
+    problem_id: int
+    # The highlight covers an occurrence of the target
+    correct: bool
+    in_time: bool
+    # Correct and in time; recorded as solved for an authenticated caller
+    solved: bool
+    time_limit_ms: int
+    # The occurrence the highlight was matched to
+    span: list[int] | None = None
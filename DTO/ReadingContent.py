@@ -7,6 +7,7 @@ class ReadingContentDTO(BaseModel):
 class ReadingContentResponseDTO(BaseModel):
     id: int
     content: str
+    content_hash: str
 
     class Config:
         from_attributes = True
\ No newline at end of file
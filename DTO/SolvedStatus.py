@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class SolvedStatusResponseDTO(BaseModel):
+    """Solved problems of the current user among the requested ids, as a list or as a bitmap over a range"""
+    solved_ids: list[int] | None = None
+    # bit i (least significant bit first) of the base64 bitmap is set when problem start_id + i is solved
+    start_id: int | None = None
+    end_id: int | None = None
+    bitmap: str | None = None
@@ -0,0 +1,82 @@
+import os
+import re
+
+from utils.text_index import needle_pattern
+
+# Sentences kept on each side of the sentences that hold the evidence or the student's selection
+ASSISTANT_CONTEXT_SENTENCES = int(os.getenv("ASSISTANT_CONTEXT_SENTENCES", 2))
+
+# A sentence runs up to its closing punctuation, including closing quotes or brackets, or to the end of the text
+_SENTENCE = re.compile(r"\S.*?(?:[.!?]+[\"'”’)\]]*(?=\s|$)|$)", re.DOTALL)
+_WORD = re.compile(r"\w{4,}")
+_GAP = " […] "
+
+
+def split_sentences(text: str) -> list[tuple[int, int]]:
+    """(start, end) offsets of the sentences of text"""
+    return [match.span() for match in _SENTENCE.finditer(text)]
+
+
+def find_anchor(text: str, anchor: str) -> tuple[int, int] | None:
+    """(start, end) of anchor in text, ignoring case and differences in whitespace"""
+    # the anchor was copied from the passage, but its line breaks and spacing may not have survived
+    pattern = needle_pattern(anchor)
+    match = pattern.search(text) if pattern is not None else None
+    return match.span() if match else None
+
+
+def _closest_sentence(text: str, sentences: list[tuple[int, int]], query: str) -> int | None:
+    """Index of the sentence sharing the most words with query, None when none shares any"""
+    keywords = {word.casefold() for word in _WORD.findall(query)}
+    best, best_score = None, 0
+    for index, (start, end) in enumerate(sentences):
+        score = len(keywords.intersection(word.casefold() for word in _WORD.findall(text, start, end)))
+        if score > best_score:
+            best, best_score = index, score
+    return best
+
+
+def passage_window(passage: str, anchors: list[str], fallback_query: str = "",
+                   radius: int = ASSISTANT_CONTEXT_SENTENCES) -> str:
+    """
+    The sentences of passage around each anchor, `radius` sentences on each side.
+
+    Separate windows are joined by an ellipsis. An anchor missing from the passage is skipped; when
+    none is found the window is centered on the sentence closest to fallback_query. Passages that fit
+    in one window come back whole.
+    """
+    sentences = split_sentences(passage)
+    if len(sentences) <= 2 * radius + 1:
+        return passage
+
+    centers = set()
+    for anchor in anchors:
+        span = find_anchor(passage, anchor)
+        if span is None:
+            continue
+        start, end = span
+        centers.update(index for index, (s_start, s_end) in enumerate(sentences) if s_start < end and start < s_end)
+    if not centers:
+        closest = _closest_sentence(passage, sentences, fallback_query)
+        if closest is None:
+            return passage
+        centers.add(closest)
+
+    kept = sorted({
+        index
+        for center in centers
+        for index in range(max(center - radius, 0), min(center + radius + 1, len(sentences)))
+    })
+    blocks = []
+    for index in kept:
+        start, end = sentences[index]
+        if blocks and blocks[-1][1] == index - 1:
+            blocks[-1] = (blocks[-1][0], index, blocks[-1][2], end)
+        else:
+            blocks.append((index, index, start, end))
+    window = _GAP.join(passage[start:end] for _, _, start, end in blocks)
+    if kept[0] > 0:
+        window = _GAP.lstrip() + window
+    if kept[-1] < len(sentences) - 1:
+        window += _GAP.rstrip()
+    return window
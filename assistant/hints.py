@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import os
+import string
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import select, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from DTO.Assistant import AssistantRequestDTO
+from model.Base import async_session_scope, async_read_session_scope
+from model.HintCache import HintCacheDB
+from utils.cache import TTLCache
+
+ASSISTANT_HINT_CACHE_SIZE = int(os.getenv("ASSISTANT_HINT_CACHE_SIZE", 4096))
+ASSISTANT_HINT_CACHE_TTL = float(os.getenv("ASSISTANT_HINT_CACHE_TTL", 6 * 3600))
+# Also keep hints in assistant_hint_table, so they survive restarts and are shared between workers
+ASSISTANT_HINT_CACHE_PERSIST = os.getenv("ASSISTANT_HINT_CACHE_PERSIST", "0").lower() in ("1", "true", "yes")
+ASSISTANT_HINT_PERSIST_TTL = float(os.getenv("ASSISTANT_HINT_PERSIST_TTL", 30 * 24 * 3600))
+
+_SELECTION_EDGES = string.punctuation + string.whitespace + "“”‘’"
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def hint_fingerprint(request: AssistantRequestDTO) -> str:
+    """
+    Cache key of a hint request: only the fields the situation's prompt is built from, normalized,
+    so students who made the same mistake on the same problem share one hint. The passage is part of
+    every prompt, so editing it makes new keys and the hints of the old passage are never served again.
+    """
+    parts: dict = {
+        "situation": request.situation,
+        "problem": _normalize(request.problemStatement),
+        "evidence": _normalize(request.correctEvidence),
+        "passage": hashlib.sha256(_normalize(request.readingContent).encode()).hexdigest(),
+    }
+    if request.situation == "wrong_evidence":
+        # highlights of the same words differ in case, spacing and the punctuation caught at the edges
+        parts["selection"] = _normalize(request.userSelectedText).strip(_SELECTION_EDGES)
+    elif request.situation == "wrong_answer":
+        parts["answers"] = [request.userAnswer, request.correctAnswer]
+        parts["options"] = [_normalize(option) for option in request.options]
+    raw = json.dumps(parts, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class HintCache:
+    """
+    Two-tier memo of assistant hints with single-flight misses.
+
+    The first tier is an in-process LRU with TTL, the optional second tier is assistant_hint_table.
+    Concurrent requests for the same fingerprint share one upstream call; if it fails they all fail
+    and nothing is stored, so callers fall back as they would without the cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, persist: bool = False, persist_ttl: float | None = None):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.persist = persist
+        self.persist_ttl = persist_ttl
+        self.persistent_hits = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.saved_calls = 0
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._table_ready = False
+
+    async def get_or_compute(self, fingerprint: str, situation: str,
+                             compute: Callable[[], Awaitable[str | None]]) -> tuple[str | None, bool]:
+        """The hint and whether it came from either tier of the cache rather than from compute"""
+        suggestion = self.memory.get(fingerprint)
+        if suggestion is not None:
+            self.saved_calls += 1
+            return suggestion, True
+
+        pending = self._in_flight.get(fingerprint)
+        if pending is not None:
+            self.coalesced += 1
+            suggestion = await asyncio.shield(pending)
+            self.saved_calls += 1
+            return suggestion, False
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[fingerprint] = future
+        try:
+            suggestion = await self._load_persistent(fingerprint)
+            cached = suggestion is not None
+            if not cached:
+                started = time.monotonic()
+                suggestion = await compute()
+                self.record_upstream(time.monotonic() - started)
+                if suggestion:
+                    await self.put(fingerprint, situation, suggestion)
+            future.set_result(suggestion)
+            return suggestion, cached
+        except BaseException as e:
+            future.set_exception(e)
+            # the waiters get the error, do not also report it as never retrieved
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[fingerprint]
+
+    async def lookup(self, fingerprint: str) -> str | None:
+        """Cached hint from either tier, without computing it on a miss"""
+        suggestion = self.memory.get(fingerprint)
+        if suggestion is not None:
+            self.saved_calls += 1
+            return suggestion
+        return await self._load_persistent(fingerprint)
+
+    async def put(self, fingerprint: str, situation: str, suggestion: str) -> None:
+        self.memory.set(fingerprint, suggestion)
+        if self.persist:
+            await store_hint(fingerprint, situation, suggestion, self.persist_ttl)
+
+    def record_upstream(self, seconds: float) -> None:
+        self.upstream_calls += 1
+        self.upstream_seconds += seconds
+
+    async def _load_persistent(self, fingerprint: str) -> str | None:
+        suggestion = await self._load(fingerprint)
+        if suggestion is not None:
+            self.persistent_hits += 1
+            self.saved_calls += 1
+            self.memory.set(fingerprint, suggestion)
+        return suggestion
+
+    async def ensure_table(self) -> None:
+        if not self._table_ready:
+            async with async_session_scope() as db:
+                await db.run_sync(lambda session: HintCacheDB.__table__.create(session.connection(), checkfirst=True))
+                await db.commit()
+            self._table_ready = True
+
+    async def _load(self, fingerprint: str) -> str | None:
+        if not self.persist:
+            return None
+        try:
+            await self.ensure_table()
+            async with async_read_session_scope() as db:
+                return await db.scalar(
+                    select(HintCacheDB.suggestion).where(
+                        HintCacheDB.fingerprint == fingerprint,
+                        or_(HintCacheDB.expires_at.is_(None), HintCacheDB.expires_at > datetime.now(timezone.utc)),
+                    )
+                )
+        except Exception as e:
+            # the persistent tier only saves upstream calls, never fail a hint because of it
+            print(f"Hint cache read error: {e!r}")
+            return None
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        lookups = self.saved_calls + self.upstream_calls
+        average_upstream = self.upstream_seconds / self.upstream_calls if self.upstream_calls else 0.0
+        return {
+            "size": memory["size"],
+            "maxsize": memory["maxsize"],
+            "memory_hits": memory["hits"],
+            "persistent_hits": self.persistent_hits,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "hit_ratio": self.saved_calls / lookups if lookups else 0.0,
+            "average_upstream_seconds": average_upstream,
+            # every call the cache answered would have taken about as long as an average upstream call
+            "saved_seconds_estimate": self.saved_calls * average_upstream,
+        }
+
+
+async def store_hint(fingerprint: str, situation: str, suggestion: str, ttl: float | None) -> bool:
+    """Write one hint to assistant_hint_table; ttl None keeps it until it is overwritten. False if that failed"""
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl) if ttl is not None else None
+    try:
+        async with async_session_scope() as db:
+            await db.execute(
+                sqlite_insert(HintCacheDB)
+                .values(fingerprint=fingerprint, situation=situation, suggestion=suggestion, expires_at=expires_at)
+                .on_conflict_do_update(
+                    index_elements=[HintCacheDB.fingerprint],
+                    set_={"suggestion": suggestion, "expires_at": expires_at,
+                          "updated_at": datetime.now(timezone.utc)},
+                )
+            )
+            await db.commit()
+        return True
+    except Exception as e:
+        print(f"Hint cache write error: {e!r}")
+        return False
+
+
+hint_cache = HintCache(
+    maxsize=ASSISTANT_HINT_CACHE_SIZE,
+    ttl=ASSISTANT_HINT_CACHE_TTL,
+    persist=ASSISTANT_HINT_CACHE_PERSIST,
+    persist_ttl=ASSISTANT_HINT_PERSIST_TTL,
+)
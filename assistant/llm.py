@@ -0,0 +1,147 @@
+import asyncio
+import os
+from typing import AsyncIterator
+
+import httpx
+from fastapi import HTTPException
+from starlette import status
+
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.request_metrics import timed
+
+# Lazy import OpenAI to avoid issues if not installed
+try:
+    from openai import AsyncOpenAI
+except ImportError:
+    AsyncOpenAI = None
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", 3))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", 15))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+# A failed call falls back to a canned hint right away, retrying would only add latency
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 0))
+
+# At most ASSISTANT_MAX_CONCURRENCY upstream calls run at once. A request that cannot get a slot
+# within ASSISTANT_QUEUE_TIMEOUT seconds falls back instead of queueing behind a slow upstream.
+ASSISTANT_MAX_CONCURRENCY = int(os.getenv("ASSISTANT_MAX_CONCURRENCY", 8))
+ASSISTANT_QUEUE_TIMEOUT = float(os.getenv("ASSISTANT_QUEUE_TIMEOUT", 2))
+
+breaker = CircuitBreaker(
+    window=int(os.getenv("ASSISTANT_BREAKER_WINDOW", 20)),
+    min_calls=int(os.getenv("ASSISTANT_BREAKER_MIN_CALLS", 5)),
+    failure_ratio=float(os.getenv("ASSISTANT_BREAKER_FAILURE_RATIO", 0.5)),
+    slow_call_seconds=float(os.getenv("ASSISTANT_BREAKER_SLOW_CALL_SECONDS", 8)),
+    open_seconds=float(os.getenv("ASSISTANT_BREAKER_OPEN_SECONDS", 30)),
+)
+
+_upstream_slots = asyncio.Semaphore(ASSISTANT_MAX_CONCURRENCY)
+_in_flight = 0
+_openai_client = None
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream call was skipped, the caller should answer with a fallback"""
+
+
+def get_openai_client():
+    """Get or initialize the OpenAI client, which shares one HTTP connection pool across requests"""
+    global _openai_client
+
+    if _openai_client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="OpenAI API key not configured"
+            )
+
+        if AsyncOpenAI is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="OpenAI library not installed"
+            )
+
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+        )
+        _openai_client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=OPENAI_MAX_RETRIES)
+
+    return _openai_client
+
+
+async def close_openai_client() -> None:
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
+
+async def _acquire_slot() -> None:
+    try:
+        # fail fast while the circuit is open instead of waiting for a slot first
+        breaker.check()
+        await asyncio.wait_for(_upstream_slots.acquire(), ASSISTANT_QUEUE_TIMEOUT)
+    except CircuitOpenError:
+        raise UpstreamUnavailable("circuit open")
+    except TimeoutError:
+        raise UpstreamUnavailable("all upstream slots busy")
+
+
+async def complete(messages: list[dict], **params) -> str | None:
+    """
+    One chat completion through the concurrency limit and the circuit breaker.
+
+    Raises UpstreamUnavailable when the call is skipped, and whatever the client raises when it fails.
+    """
+    global _in_flight
+    client = get_openai_client()
+    await _acquire_slot()
+    _in_flight += 1
+    try:
+        with timed("llm"):
+            completion = await breaker.call(
+                lambda: client.chat.completions.create(model=OPENAI_MODEL, messages=messages, **params)
+            )
+    except CircuitOpenError:
+        raise UpstreamUnavailable("circuit open")
+    finally:
+        _in_flight -= 1
+        _upstream_slots.release()
+    return completion.choices[0].message.content
+
+
+async def stream(messages: list[dict], **params) -> AsyncIterator[str]:
+    """
+    Like complete(), but yields the completion's text as the model produces it.
+
+    The slot is held and the breaker counts one call until the stream ends, fails or is closed.
+    """
+    global _in_flight
+    client = get_openai_client()
+    await _acquire_slot()
+    _in_flight += 1
+    try:
+        with timed("llm"):
+            async with breaker.guard():
+                chunks = await client.chat.completions.create(
+                    model=OPENAI_MODEL, messages=messages, stream=True, **params
+                )
+                async for chunk in chunks:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+    except CircuitOpenError:
+        raise UpstreamUnavailable("circuit open")
+    finally:
+        _in_flight -= 1
+        _upstream_slots.release()
+
+
+def upstream_stats() -> dict:
+    return {
+        **breaker.stats(),
+        "max_concurrency": ASSISTANT_MAX_CONCURRENCY,
+        "in_flight": _in_flight,
+    }
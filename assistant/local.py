@@ -0,0 +1,76 @@
+import re
+
+from DTO.Assistant import AssistantRequestDTO
+from assistant.context import find_anchor
+
+_WORD = re.compile(r"[^\W\d_][\w'-]{3,}")
+_STOPWORDS = frozenset("""
+    about above according after again against also among because been before being below between both could
+    does doing down during each either following from further have having here itself just many more most much
+    neither only other over passage same should since some statement such than that their them then there these
+    they this those through under until upon very were what when where which while whom whose will with within
+    without would writer author text
+""".split())
+
+
+def keywords(text: str) -> list[str]:
+    """Content words of text in order of appearance, lowercased, each once"""
+    return list(dict.fromkeys(
+        word for word in (match.casefold() for match in _WORD.findall(text)) if word not in _STOPWORDS
+    ))
+
+
+def _quote(words: list[str]) -> str:
+    quoted = [f'"{word}"' for word in words]
+    return " and ".join(quoted) if len(quoted) <= 2 else ", ".join(quoted[:-1]) + " and " + quoted[-1]
+
+
+def _where(passage: str, evidence: str) -> str:
+    span = find_anchor(passage, evidence)
+    if span is None or not passage:
+        return ""
+    position = span[0] / len(passage)
+    region = "beginning" if position < 1 / 3 else "middle" if position < 2 / 3 else "end"
+    return f" in the {region} of the passage"
+
+
+def local_hint(request: AssistantRequestDTO) -> str | None:
+    """
+    A specific hint built without the model, from the words the question, the evidence and the student's
+    selection or answer have in common. Takes well under a millisecond. None when the texts share too little
+    to say anything better than the generic fallback.
+    """
+    question = keywords(request.problemStatement)
+    evidence = keywords(request.correctEvidence)
+    evidence_words = set(evidence)
+    # the question's words that the evidence repeats are the ones worth scanning for
+    cues = [word for word in question if word in evidence_words][:2] or question[:2]
+    where = _where(request.readingContent, request.correctEvidence)
+
+    if request.situation == 'stuck':
+        if not cues:
+            return None
+        return f"Scan for {_quote(cues)} from the question{where}, then read that sentence carefully."
+
+    if request.situation == 'wrong_evidence':
+        if not cues:
+            return None
+        selected = set(keywords(request.userSelectedText))
+        missing = [word for word in cues if word not in selected]
+        if missing:
+            return (f"Your selection doesn't mention {_quote(missing)} from the question. "
+                    f"Look for {'it' if len(missing) == 1 else 'them'}{where} instead.")
+        return (f"Your selection mentions {_quote(cues)}, but it doesn't answer the question. "
+                f"Look{where} for the sentence that does.")
+
+    if request.situation == 'wrong_answer':
+        if request.userAnswer is None or not 0 <= request.userAnswer < len(request.options):
+            return None
+        unsupported = [word for word in keywords(request.options[request.userAnswer]) if word not in evidence_words]
+        if unsupported:
+            return (f"The evidence never mentions {_quote(unsupported[:2])}. "
+                    "Compare your answer with what the evidence actually says.")
+        if evidence:
+            return (f"Reread the evidence about {_quote(evidence[:2])} and check that your answer "
+                    "says exactly the same thing, not just similar words.")
+    return None
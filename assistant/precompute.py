@@ -0,0 +1,109 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import select, or_
+
+from DTO.Assistant import AssistantRequestDTO
+from assistant.context import passage_window
+from assistant.hints import ASSISTANT_HINT_CACHE_PERSIST, hint_cache, hint_fingerprint, store_hint
+from assistant.llm import complete
+from assistant.prompts import COMPLETION_PARAMS, build_messages
+from model.Base import async_read_session_scope
+from model.HintCache import HintCacheDB
+
+# Precompute the hints of an evidence problem when it is created or updated. Off by default without the
+# persistent hint tier, which is what serves them to other workers and after a restart.
+ASSISTANT_PRECOMPUTE_HINTS = os.getenv(
+    "ASSISTANT_PRECOMPUTE_HINTS", "1" if ASSISTANT_HINT_CACHE_PERSIST else "0"
+).lower() in ("1", "true", "yes")
+# Upstream calls the create and update routes may run at once for precomputation, kept low to leave
+# the upstream slots to live hint requests
+ASSISTANT_PRECOMPUTE_CONCURRENCY = int(os.getenv("ASSISTANT_PRECOMPUTE_CONCURRENCY", 2))
+
+_precompute_slots = asyncio.Semaphore(ASSISTANT_PRECOMPUTE_CONCURRENCY)
+
+
+@dataclass(frozen=True, slots=True)
+class ProblemHintSource:
+    """The fields of an evidence problem its hints depend on, copied so they outlive the session"""
+    problem_statement: str
+    reading_content: str
+    evidence: str
+    options: tuple[str, ...]
+    correct_option: int
+
+    @classmethod
+    def of(cls, problem) -> "ProblemHintSource":
+        return cls(problem.problem_statement, problem.reading_content, problem.evidence,
+                   tuple(problem.options), problem.correct_option)
+
+
+def problem_hint_requests(problem: ProblemHintSource) -> list[AssistantRequestDTO]:
+    """
+    The hint requests that do not depend on the student: `stuck`, and `wrong_answer` for every wrong option.
+    Built like /assistant/suggest/problem builds them, so they have the same fingerprints.
+    """
+    common = dict(
+        problemStatement=problem.problem_statement,
+        readingContent=passage_window(problem.reading_content, [problem.evidence], problem.problem_statement),
+        correctEvidence=problem.evidence,
+        userSelectedText="",
+        correctAnswer=problem.correct_option,
+        options=list(problem.options),
+    )
+    requests = [AssistantRequestDTO(**common, userAnswer=None, situation='stuck')]
+    requests += [
+        AssistantRequestDTO(**common, userAnswer=option, situation='wrong_answer')
+        for option in range(len(problem.options)) if option != problem.correct_option
+    ]
+    return requests
+
+
+async def stored_fingerprints(fingerprints: list[str]) -> set[str]:
+    async with async_read_session_scope() as db:
+        return set((await db.scalars(
+            select(HintCacheDB.fingerprint).where(
+                HintCacheDB.fingerprint.in_(fingerprints),
+                or_(HintCacheDB.expires_at.is_(None), HintCacheDB.expires_at > datetime.now(timezone.utc)),
+            )
+        )).all())
+
+
+async def precompute_problem_hints(problem: ProblemHintSource, slots: asyncio.Semaphore,
+                                   force: bool = False) -> tuple[int, int, int]:
+    """
+    Generate and store the problem's student-independent hints, without expiry.
+
+    Hints already stored are skipped unless force, so a run that failed halfway picks up where it stopped.
+    Returns the number of hints generated, skipped and failed.
+    """
+    await hint_cache.ensure_table()
+    requests = {hint_fingerprint(request): request for request in problem_hint_requests(problem)}
+    done = set() if force else await stored_fingerprints(list(requests))
+
+    async def generate(fingerprint: str, request: AssistantRequestDTO) -> bool:
+        async with slots:
+            try:
+                suggestion = await complete(build_messages(request), **COMPLETION_PARAMS)
+            except Exception as e:
+                print(f"Hint precompute error: {e!r}")
+                return False
+        if not suggestion or not await store_hint(fingerprint, request.situation, suggestion, ttl=None):
+            return False
+        hint_cache.memory.set(fingerprint, suggestion)
+        return True
+
+    results = await asyncio.gather(*(
+        generate(fingerprint, request) for fingerprint, request in requests.items() if fingerprint not in done
+    ))
+    return sum(results), len(done), len(results) - sum(results)
+
+
+async def precompute_in_background(problem: ProblemHintSource) -> None:
+    """Background task of the evidence problem create and update routes"""
+    try:
+        await precompute_problem_hints(problem, _precompute_slots)
+    except Exception as e:
+        print(f"Hint precompute error: {e!r}")
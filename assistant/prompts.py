@@ -0,0 +1,92 @@
+from DTO.Assistant import AssistantRequestDTO
+
+SYSTEM_PROMPT = """You are a helpful IELTS reading practice assistant. Your role is to provide brief, encouraging guidance to students when they make mistakes.
+
+Guidelines:
+- Keep responses under 40 words
+- Be encouraging and supportive, never discouraging
+- Provide specific, actionable hints based on what they selected
+- Point out what to look for without giving the answer
+- Reference specific keywords or concepts from the text
+- Help them develop critical thinking skills"""
+
+# Fallback messages if OpenAI fails
+FALLBACK_MESSAGES = {
+    'wrong_evidence': "That selection doesn't seem to answer the question. Look for specific keywords from the question in the passage.",
+    'wrong_answer': "Not quite right. Compare your answer carefully with what the evidence actually says.",
+    'stuck': "Take your time. Try scanning for keywords from the question, then read that section carefully."
+}
+DEFAULT_FALLBACK = "Keep going! You're doing great!"
+# Used when the model answers with an empty completion
+EMPTY_SUGGESTION = 'Keep trying! You can do this!'
+
+COMPLETION_PARAMS = {'temperature': 0.7, 'max_tokens': 150}
+
+
+def fallback_message(situation: str) -> str:
+    return FALLBACK_MESSAGES.get(situation, DEFAULT_FALLBACK)
+
+
+def build_user_prompt(request: AssistantRequestDTO) -> str:
+    """Build user prompt based on situation"""
+    if request.situation == 'wrong_evidence':
+        return f"""The student is trying to answer: "{request.problemStatement}"
+
+They highlighted this text: "{request.userSelectedText}"
+
+But this is incorrect. The correct evidence is somewhere else in this passage:
+\"\"\"
+{request.readingContent}
+\"\"\"
+
+The correct evidence contains: "{request.correctEvidence}"
+
+Help them understand:
+1. Why their selection doesn't answer the question
+2. What keywords from the question they should look for
+3. What part of the passage might contain the answer
+
+Keep it brief but specific to their mistake."""
+
+    elif request.situation == 'wrong_answer':
+        return f"""The student selected: "{request.options[request.userAnswer]}"
+
+But the correct answer is: "{request.options[request.correctAnswer]}"
+
+Here's the evidence they found: "{request.correctEvidence}"
+
+The full reading passage:
+\"\"\"
+{request.readingContent}
+\"\"\"
+
+Help them understand:
+1. Why their selected answer doesn't match the evidence
+2. What the evidence actually says
+3. How to better interpret the evidence
+
+Be specific about the mismatch between what they chose and what the evidence says."""
+
+    elif request.situation == 'stuck':
+        return f"""The student seems stuck on: "{request.problemStatement}"
+
+Reading passage:
+\"\"\"
+{request.readingContent}
+\"\"\"
+
+Give them a gentle hint:
+1. What keywords to look for
+2. What section of the passage might help
+3. What strategy to use (scanning, careful reading, etc.)
+
+Keep it encouraging and actionable."""
+
+    return ""
+
+
+def build_messages(request: AssistantRequestDTO) -> list[dict]:
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': build_user_prompt(request)}
+    ]
@@ -1,3 +1,7 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import timedelta, datetime, timezone
 from typing import Optional
 
@@ -9,17 +13,37 @@ from passlib.context import CryptContext
 from pydantic import BaseModel
 import os
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from model.Base import get_db
+from model.Base import get_async_read_db
 from model.User import UserDB
+from utils.cache import TTLCache
+from utils.request_metrics import timed
 
 SECRET_KEY = os.getenv("AUTH_SECRET")  # Change this in production!
 ALGORITHM = os.getenv("AUTH_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES",30)
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+# argon2 is CPU bound, so request handlers hash in a process pool instead of on the event loop.
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", os.cpu_count() or 1))
+HASH_MAX_IN_FLIGHT = int(os.getenv("HASH_MAX_IN_FLIGHT", HASH_POOL_WORKERS))
+HASH_MAX_QUEUED = int(os.getenv("HASH_MAX_QUEUED", 64))
+
+_hash_pool: ProcessPoolExecutor | None = None
+_hash_slots = asyncio.Semaphore(HASH_MAX_IN_FLIGHT)
+_hash_pending = 0
+
+# Authenticated principals keyed by the raw bearer token, so repeat callers skip both the JWT decode
+# and the user lookup. Entries never outlive the token and are dropped when this process changes the user
+# row through the ORM; a change made anywhere else shows once the entry expires.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 4096))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
 
 
 def verify_password(plain_password, hashed_password):
@@ -30,6 +54,62 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+def get_hash_pool() -> ProcessPoolExecutor:
+    """Get or start the password hashing process pool"""
+    global _hash_pool
+
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=HASH_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+async def _run_in_hash_pool(fn, *args):
+    """
+    Run a hashing function in the process pool.
+
+    At most HASH_MAX_IN_FLIGHT calls run at once and at most HASH_MAX_QUEUED wait for a slot,
+    anything beyond that is rejected with 503 so a login burst cannot pile up unbounded work.
+    """
+    global _hash_pending
+
+    if _hash_pending >= HASH_MAX_IN_FLIGHT + HASH_MAX_QUEUED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+    _hash_pending += 1
+    try:
+        async with _hash_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(get_hash_pool(), fn, *args)
+    finally:
+        _hash_pending -= 1
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    with timed("auth"):
+        return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password) -> str:
+    with timed("auth"):
+        return await _run_in_hash_pool(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -50,18 +130,57 @@ class Token(BaseModel):
     token_type: str
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    The authenticated caller: what authorization and the per-user routes need, detached from any session.
+    Routes that need the rest of the user row load it with get_current_user_row.
+    """
+    id: int
+    username: str
+    role: str
+
+
+def _cache_principal(token: str, principal: Principal, expires_at: float | None) -> None:
+    ttl = PRINCIPAL_CACHE_TTL
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        principal_cache.set(token, principal, ttl=ttl)
+
+
+def invalidate_principal(user_id: int) -> None:
+    principal_cache.remove_where(lambda principal: principal.id == user_id)
+
+
+@event.listens_for(UserDB, "after_update")
+@event.listens_for(UserDB, "after_delete")
+def _invalidate_principal_on_change(mapper, connection, target: UserDB) -> None:
+    invalidate_principal(target.id)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme),
+                           db: AsyncSession = Depends(get_async_read_db)) -> Principal:
     """
     Inject this function to other function to get current user, and make sure that the user need to be logged in
     :param token:
     :param db:
     :return:
     """
+    with timed("auth"):
+        return await _authenticate(token, db)
+
+
+async def _authenticate(token: str, db: AsyncSession) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached_principal = principal_cache.get(token)
+    if cached_principal is not None:
+        return cached_principal
+
     try:
         # PyJWT decode
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -81,13 +200,49 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         # This catches all PyJWT errors (expired, invalid signature, etc.)
         raise credentials_exception
 
-    user = db.query(UserDB).filter(UserDB.username == username).first()
-    if user is None:
+    row = (await db.execute(
+        select(UserDB.id, UserDB.username, UserDB.role).where(UserDB.username == username)
+    )).first()
+    if row is None:
         print("Cannot find user in database")
         raise credentials_exception
+    principal = Principal(row.id, row.username, row.role)
+    _cache_principal(token, principal, payload.get("exp"))
+    return principal
+
+async def get_optional_user(token: str | None = Depends(optional_oauth2_scheme),
+                            db: AsyncSession = Depends(get_async_read_db)) -> Principal | None:
+    """
+    Same as get_current_user for endpoints that also serve anonymous callers, who get None instead of a 401.
+    A token that is invalid or expired makes the caller anonymous too, so a stale token left in a client
+    cannot break a public endpoint.
+    """
+    if token is None:
+        return None
+    try:
+        return await get_current_user(token, db)
+    except HTTPException as error:
+        if error.status_code != status.HTTP_401_UNAUTHORIZED:
+            raise
+        return None
+
+
+async def get_current_user_row(principal: Principal = Depends(get_current_user),
+                               db: AsyncSession = Depends(get_async_read_db)) -> UserDB:
+    """The caller's full user row, for the routes that need more than the principal"""
+    user = await db.get(UserDB, principal.id)
+    if user is None:
+        # deleted since the principal was cached
+        invalidate_principal(principal.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
-def require_admin(current_user: UserDB = Depends(get_current_user)) -> UserDB:
+
+def require_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
     if current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
     return current_user
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""Benchmark the API routes in-process against a generated SQLite database and compare with a stored baseline.
+
+    python -m bench --size small --concurrency 16 --requests 500
+    python -m bench --size medium --save                # record bench/baselines/medium-c16.json
+    python -m bench --size medium --routes evidence_all evidence_search
+
+Every route runs on its own through an httpx ASGI transport, so the numbers include routing, dependencies,
+the database and serialization but no network. /assistant/suggest talks to a stub model that answers
+after --llm-latency-ms. The database is generated once per size and seed with script.gen_scale_data and
+reused by later runs; solved_by_user writes to it, pass --reseed to start from a fresh one.
+
+Exits with status 1 when a route's p95 latency or throughput is worse than the baseline by more than
+--threshold, or when it fails more often.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT / "bench" / "data"
+BASELINE_DIR = ROOT / "bench" / "baselines"
+
+# users, evidence problems, flashlight problems, solves
+SIZES = {
+    "small": (1_000, 7_000, 3_000, 100_000),
+    "medium": (10_000, 70_000, 30_000, 1_000_000),
+    "large": (100_000, 700_000, 300_000, 10_000_000),
+}
+PASSWORD_VARIANTS = 8
+
+
+def _seed_database(path: Path, args) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for stale in path.parent.glob(f"{path.name}*"):
+        stale.unlink()
+    print(f"Generating {path.name} ...", file=sys.stderr)
+    subprocess.run([
+        sys.executable, "-m", "script.gen_scale_data", "--reset",
+        "--users", str(args.users), "--evidence-problems", str(args.evidence_problems),
+        "--flashlight-problems", str(args.flashlight_problems), "--solves", str(args.solves),
+        "--password-variants", str(PASSWORD_VARIANTS), "--seed", str(args.seed),
+    ], cwd=ROOT, env={**os.environ, "DATABASE_URL": f"sqlite:///{path}"}, check=True, stdout=sys.stderr)
+
+
+async def _run(args, routes: list[str]):
+    import httpx
+
+    from bench.runner import run_scenario
+    from bench.scenarios import SCENARIOS, BenchContext
+    from bench.stub_llm import install_stub_llm
+    from main import app
+    from model.Base import engine
+
+    install_stub_llm(args.llm_latency_ms)
+    with engine.connect() as connection:
+        ctx = BenchContext.load(connection, random.Random(args.seed), args.active_users, PASSWORD_VARIANTS)
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in routes:
+                print(f"  {name}", file=sys.stderr)
+                # the routes' own logging would drown the report
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    results[name] = await run_scenario(client, SCENARIOS[name], ctx, args.seed, args.requests,
+                                                       args.warmup, args.concurrency)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API routes against a generated database.")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--users", type=int, help="override the size's user count")
+    parser.add_argument("--evidence-problems", type=int)
+    parser.add_argument("--flashlight-problems", type=int)
+    parser.add_argument("--solves", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reseed", action="store_true", help="generate the database again")
+    parser.add_argument("--routes", nargs="+", metavar="ROUTE", help="routes to run, all by default")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at once")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per route before those")
+    parser.add_argument("--active-users", type=int, default=200, help="users the authenticated requests come from")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--baseline", type=Path, help="baseline file, bench/baselines/<size>-c<concurrency>.json")
+    parser.add_argument("--save", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="p95 increases below this are noise")
+    args = parser.parse_args()
+
+    preset = SIZES[args.size]
+    overrides = (args.users, args.evidence_problems, args.flashlight_problems, args.solves)
+    args.users, args.evidence_problems, args.flashlight_problems, args.solves = (
+        preset_value if value is None else value for value, preset_value in zip(overrides, preset)
+    )
+    label = args.size if all(value is None for value in overrides) else \
+        f"{args.users}u-{args.evidence_problems + args.flashlight_problems}p-{args.solves}s"
+
+    # model.Base reads DATABASE_URL on import, nothing of the app may be imported before it is set
+    database = DATA_DIR / f"{label}-seed{args.seed}.db"
+    if args.reseed or not database.exists():
+        _seed_database(database, args)
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ.setdefault("AUTH_SECRET", "bench")
+
+    from bench.runner import format_table, load_baseline, regressions, save_baseline
+    from bench.scenarios import SCENARIOS
+    from model.Base import DB_MODE
+
+    routes = args.routes or list(SCENARIOS)
+    unknown = sorted(set(routes) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown routes {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}")
+
+    results = asyncio.run(_run(args, routes))
+
+    baseline_path = args.baseline or BASELINE_DIR / f"{label}-c{args.concurrency}.json"
+    baseline = None if args.save else load_baseline(baseline_path)
+    print(format_table(results, baseline))
+
+    meta = {
+        "size": label,
+        "users": args.users,
+        "evidence_problems": args.evidence_problems,
+        "flashlight_problems": args.flashlight_problems,
+        "solves": args.solves,
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "llm_latency_ms": args.llm_latency_ms,
+        "db_mode": DB_MODE,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    if args.save:
+        save_baseline(baseline_path, meta, results)
+        print(f"\nBaseline saved to {baseline_path}")
+        return
+    if baseline is None:
+        print(f"\nNo baseline at {baseline_path}, run with --save to record one")
+        return
+
+    changed = [key for key in ("concurrency", "requests", "llm_latency_ms", "db_mode")
+               if baseline["meta"].get(key) != meta[key]]
+    if changed:
+        print(f"\nWarning: the baseline was recorded with a different {', '.join(changed)}")
+    found = regressions(results, baseline, args.threshold, args.min_delta_ms)
+    if found:
+        print(f"\nRegressed by more than {args.threshold:.0%}:")
+        print("\n".join(f"  {line}" for line in found))
+        sys.exit(1)
+    print(f"\nNo route regressed by more than {args.threshold:.0%} against {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+import httpx
+
+from bench.scenarios import BenchContext, Scenario
+
+
+@dataclass(frozen=True, slots=True)
+class RouteResult:
+    requests: int
+    # responses with a 4xx or 5xx status, or requests that raised
+    errors: int
+    rps: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    @classmethod
+    def of(cls, latencies: list[float], errors: int, elapsed: float) -> "RouteResult":
+        latencies_ms = [latency * 1000 for latency in latencies]
+        # cut points 1..99 of the latency distribution
+        cuts = statistics.quantiles(latencies_ms, n=100, method="inclusive") if len(latencies_ms) > 1 \
+            else latencies_ms * 99
+        return cls(
+            requests=len(latencies_ms),
+            errors=errors,
+            rps=round(len(latencies_ms) / elapsed, 1),
+            mean_ms=round(statistics.fmean(latencies_ms), 2),
+            p50_ms=round(cuts[49], 2),
+            p95_ms=round(cuts[94], 2),
+            p99_ms=round(cuts[98], 2),
+        )
+
+
+async def _drive(client: httpx.AsyncClient, scenario: Scenario, ctx: BenchContext, rng: random.Random,
+                 count: int, concurrency: int) -> tuple[list[float], int, float]:
+    latencies: list[float] = []
+    errors = 0
+    remaining = count
+
+    async def worker() -> None:
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            request = scenario.build(rng, ctx)
+            started = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, count))))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, ctx: BenchContext, seed: int,
+                       requests: int, warmup: int, concurrency: int) -> RouteResult:
+    """requests calls of the scenario from concurrency workers at once, after warmup calls that are not counted"""
+    rng = random.Random(f"{seed}-{scenario.name}")
+    if warmup:
+        await _drive(client, scenario, ctx, rng, warmup, concurrency)
+    latencies, errors, elapsed = await _drive(client, scenario, ctx, rng, requests, concurrency)
+    return RouteResult.of(latencies, errors, elapsed)
+
+
+def load_baseline(path: Path) -> dict | None:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_baseline(path: Path, meta: dict, results: dict[str, RouteResult]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(
+        {"meta": meta, "routes": {name: asdict(result) for name, result in results.items()}}, indent=2
+    ) + "\n")
+
+
+def regressions(results: dict[str, RouteResult], baseline: dict, threshold: float,
+                min_delta_ms: float) -> list[str]:
+    """
+    Routes that got slower or less reliable than the baseline: p95 up or throughput down by more than
+    threshold, or more errors. A p95 change below min_delta_ms is taken as noise however large relatively.
+    """
+    found = []
+    for name, result in results.items():
+        base = baseline["routes"].get(name)
+        if base is None:
+            continue
+        if result.p95_ms > base["p95_ms"] * (1 + threshold) and result.p95_ms - base["p95_ms"] > min_delta_ms:
+            found.append(f"{name}: p95 {base['p95_ms']}ms -> {result.p95_ms}ms")
+        if result.rps < base["rps"] / (1 + threshold):
+            found.append(f"{name}: throughput {base['rps']}/s -> {result.rps}/s")
+        if result.errors > base["errors"]:
+            found.append(f"{name}: errors {base['errors']} -> {result.errors}")
+    return found
+
+
+def format_table(results: dict[str, RouteResult], baseline: dict | None) -> str:
+    header = f"{'route':<34}{'req':>7}{'err':>5}{'req/s':>10}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+    if baseline:
+        header += f"{'base p95':>10}"
+    lines = [header, "-" * len(header)]
+    for name, result in results.items():
+        line = (f"{name:<34}{result.requests:>7}{result.errors:>5}{result.rps:>10.1f}"
+                f"{result.mean_ms:>9.2f}{result.p50_ms:>9.2f}{result.p95_ms:>9.2f}{result.p99_ms:>9.2f}")
+        if baseline and name in baseline["routes"]:
+            line += f"{baseline['routes'][name]['p95_ms']:>10.2f}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,119 @@
+import random
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import select, func, Connection
+
+from auth.auth import create_access_token
+from model.EvidenceProblem import EvidenceProblemDB
+from model.FlashlightProblem import FlashlightProblemDB
+from model.ReadingContent import ReadingContentDB
+from model.User import UserDB
+from script.gen_scale_data import WORDS, username, user_password
+
+# Catalog pages the list benchmarks pick from, students rarely page further
+LIST_PAGES = 100
+# Evidence problems the assistant requests are built from
+HINT_PROBLEMS = 200
+
+
+@dataclass
+class BenchContext:
+    """What the scenarios draw their requests from, loaded once from the seeded database"""
+    user_ids: list[int]
+    tokens: dict[int, str]
+    password_variants: int
+    evidence_max_id: int
+    flashlight_max_id: int
+    hint_problems: list[dict]
+
+    @classmethod
+    def load(cls, connection: Connection, rng: random.Random, active_users: int,
+             password_variants: int) -> "BenchContext":
+        user_count = connection.scalar(select(func.max(UserDB.id))) or 0
+        user_ids = rng.sample(range(1, user_count + 1), min(active_users, user_count))
+        evidence_max_id = connection.scalar(select(func.max(EvidenceProblemDB.id))) or 0
+        hint_ids = rng.sample(range(1, evidence_max_id + 1), min(HINT_PROBLEMS, evidence_max_id))
+        rows = connection.execute(
+            select(EvidenceProblemDB.problem_statement, EvidenceProblemDB.evidence, EvidenceProblemDB.options,
+                   EvidenceProblemDB.correct_option, ReadingContentDB.content)
+            .join(ReadingContentDB, ReadingContentDB.id == EvidenceProblemDB.reading_content_id)
+            .where(EvidenceProblemDB.id.in_(hint_ids))
+        ).mappings().all()
+        return cls(
+            user_ids=user_ids,
+            tokens={user_id: create_access_token(data={"sub": username(user_id)}) for user_id in user_ids},
+            password_variants=password_variants,
+            evidence_max_id=evidence_max_id,
+            flashlight_max_id=connection.scalar(select(func.max(FlashlightProblemDB.id))) or 0,
+            hint_problems=[dict(row) for row in rows],
+        )
+
+    def auth(self, rng: random.Random) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[rng.choice(self.user_ids)]}"}
+
+
+@dataclass(frozen=True, slots=True)
+class Scenario:
+    name: str
+    # keyword arguments of one httpx request
+    build: Callable[[random.Random, BenchContext], dict]
+
+
+def _token(rng: random.Random, ctx: BenchContext) -> dict:
+    user_id = rng.choice(ctx.user_ids)
+    return {"method": "POST", "url": "/token",
+            "data": {"username": username(user_id), "password": user_password(user_id, ctx.password_variants)}}
+
+
+def _suggest(rng: random.Random, ctx: BenchContext) -> dict:
+    """A mix of situations: stuck hints repeat and come from the hint cache, the others mostly miss it"""
+    problem = rng.choice(ctx.hint_problems)
+    situation = rng.choice(("stuck", "wrong_evidence", "wrong_answer"))
+    words = problem["content"].split()
+    start = rng.randrange(max(len(words) - 12, 1))
+    wrong_options = [option for option in range(len(problem["options"])) if option != problem["correct_option"]]
+    return {"method": "POST", "url": "/assistant/suggest", "json": {
+        "problemStatement": problem["problem_statement"],
+        "readingContent": problem["content"],
+        "correctEvidence": problem["evidence"],
+        "userSelectedText": " ".join(words[start:start + rng.randint(6, 12)]) if situation == "wrong_evidence" else "",
+        "userAnswer": rng.choice(wrong_options) if situation == "wrong_answer" else None,
+        "correctAnswer": problem["correct_option"],
+        "options": problem["options"],
+        "situation": situation,
+    }}
+
+
+def _catalog_scenarios(kind: str, max_id: Callable[[BenchContext], int]) -> list[Scenario]:
+    prefix = f"/{kind}_problem"
+
+    def problem_id(rng: random.Random, ctx: BenchContext) -> int:
+        return rng.randint(1, max_id(ctx))
+
+    return [
+        Scenario(f"{kind}_all", lambda rng, ctx: {
+            "method": "GET", "url": f"{prefix}/all",
+            "params": {"page": rng.randrange(max(min(max_id(ctx) // 50, LIST_PAGES), 1))}}),
+        Scenario(f"{kind}_search", lambda rng, ctx: {
+            "method": "GET", "url": f"{prefix}/search", "params": {"q": rng.choice(WORDS)}}),
+        Scenario(f"{kind}_get", lambda rng, ctx: {
+            "method": "GET", "url": f"{prefix}/get/{problem_id(rng, ctx)}"}),
+        Scenario(f"{kind}_solved_by_user", lambda rng, ctx: {
+            "method": "POST", "url": f"{prefix}/solved_by_user", "params": {"question_id": problem_id(rng, ctx)},
+            "headers": ctx.auth(rng)}),
+        Scenario(f"{kind}_is_solved_by_user", lambda rng, ctx: {
+            "method": "GET", "url": f"{prefix}/is_solved_by_user", "params": {"problem_id": problem_id(rng, ctx)},
+            "headers": ctx.auth(rng)}),
+        Scenario(f"{kind}_get_user_track_status", lambda rng, ctx: {
+            "method": "GET", "url": f"{prefix}/get_user_track_status", "headers": ctx.auth(rng)}),
+    ]
+
+
+SCENARIOS = {scenario.name: scenario for scenario in [
+    Scenario("token", _token),
+    Scenario("users_me", lambda rng, ctx: {"method": "GET", "url": "/users/me", "headers": ctx.auth(rng)}),
+    *_catalog_scenarios("evidence", lambda ctx: ctx.evidence_max_id),
+    *_catalog_scenarios("flashlight", lambda ctx: ctx.flashlight_max_id),
+    Scenario("assistant_suggest", _suggest),
+]}
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+import httpx
+
+from assistant import llm
+
+STUB_SUGGESTION = "Look again at the sentence that mentions the key words of the question."
+
+
+def install_stub_llm(latency_ms: float) -> None:
+    """
+    Point the assistant at an OpenAI client whose transport answers every chat completion after latency_ms,
+    so /assistant/suggest runs its whole path (slots, breaker, SDK parsing, hint cache) without the network.
+    """
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency_ms / 1000)
+        return httpx.Response(200, json={
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": llm.OPENAI_MODEL,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_SUGGESTION},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    llm._openai_client = llm.AsyncOpenAI(
+        api_key="bench",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        max_retries=0,
+    )
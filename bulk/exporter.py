@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator, Iterator
+
+from sqlalchemy import select, Select
+from sqlalchemy.orm import Session
+
+from model.Base import async_read_session_scope, user_evidence_problem_association, \
+    user_flashlight_problem_association
+from model.EvidenceProblem import EvidenceProblemDB
+from model.FlashlightProblem import FlashlightProblemDB
+from model.ReadingContent import ReadingContentDB
+
+# Rows fetched from the cursor and written out at a time, which bounds the memory an export holds
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 1000))
+
+# Problem exports carry the create DTO fields, so an NDJSON export imports back with bulk/importer.py
+EXPORTS: dict[str, Select] = {
+    "evidence_problems": select(
+        EvidenceProblemDB.id, EvidenceProblemDB.problem_statement, ReadingContentDB.content.label("reading_content"),
+        EvidenceProblemDB.evidence, EvidenceProblemDB.options, EvidenceProblemDB.correct_option,
+        EvidenceProblemDB.created_at, EvidenceProblemDB.updated_at,
+    ).join(ReadingContentDB, ReadingContentDB.id == EvidenceProblemDB.reading_content_id)
+    .order_by(EvidenceProblemDB.id),
+    "flashlight_problems": select(
+        FlashlightProblemDB.id, FlashlightProblemDB.problem_statement,
+        ReadingContentDB.content.label("reading_content"), FlashlightProblemDB.target,
+        FlashlightProblemDB.created_at, FlashlightProblemDB.updated_at,
+    ).join(ReadingContentDB, ReadingContentDB.id == FlashlightProblemDB.reading_content_id)
+    .order_by(FlashlightProblemDB.id),
+    "evidence_progress": select(user_evidence_problem_association)
+    .order_by(*user_evidence_problem_association.primary_key.columns),
+    "flashlight_progress": select(user_flashlight_problem_association)
+    .order_by(*user_flashlight_problem_association.primary_key.columns),
+}
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _csv_cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _columns(name: str) -> list[str]:
+    return list(EXPORTS[name].selected_columns.keys())
+
+
+def _header(name: str, fmt: str) -> bytes:
+    if fmt != "csv":
+        return b""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(_columns(name))
+    return buffer.getvalue().encode()
+
+
+def _encode(rows, columns: list[str], fmt: str) -> bytes:
+    if fmt == "ndjson":
+        return "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) + "\n" for row in rows
+        ).encode()
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_csv_cell(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def _statement(name: str) -> Select:
+    # yield_per keeps the driver cursor open and fetches EXPORT_CHUNK_ROWS rows at a time
+    return EXPORTS[name].execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+
+async def export_stream(name: str, fmt: str) -> AsyncIterator[bytes]:
+    """One export as chunks of encoded rows, read through its own session so it can outlive the request handler"""
+    columns = _columns(name)
+    header = _header(name, fmt)
+    if header:
+        yield header
+    async with async_read_session_scope() as db:
+        result = await db.stream(_statement(name))
+        async for rows in result.partitions():
+            yield _encode(rows, columns, fmt)
+
+
+def export_chunks(session: Session, name: str, fmt: str) -> Iterator[bytes]:
+    """Same as export_stream through a sync session, for the CLI"""
+    columns = _columns(name)
+    header = _header(name, fmt)
+    if header:
+        yield header
+    for rows in session.execute(_statement(name)).partitions():
+        yield _encode(rows, columns, fmt)
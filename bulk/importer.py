@@ -0,0 +1,197 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field, asdict
+from typing import AsyncIterable, AsyncIterator, Callable
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select, insert, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from DTO.EvidenceProblem import EvidenceProblemDTO
+from DTO.FlashlightProblem import FlashlightProblemDTO
+from model.Base import SessionLocal
+from model.EvidenceProblem import EvidenceProblemDB
+from model.FlashlightProblem import FlashlightProblemDB
+from model.ReadingContent import ReadingContentDB, hash_content
+from utils.text_index import find_occurrences, find_token_range, token_offsets
+
+# Rows inserted per transaction
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+# Invalid rows listed in a report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass(frozen=True, slots=True)
+class ImportKind:
+    model: type
+    dto: type[BaseModel]
+    # The problem's own columns for a validated row. The ORM flush listeners do not run for Core inserts,
+    # so the answer indexes are built here.
+    columns: Callable[[BaseModel], dict]
+
+
+IMPORT_KINDS = {
+    "evidence": ImportKind(EvidenceProblemDB, EvidenceProblemDTO, lambda row: {
+        "problem_statement": row.problem_statement,
+        "evidence": row.evidence,
+        "options": row.options,
+        "correct_option": row.correct_option,
+        "evidence_tokens": find_token_range(row.reading_content, row.evidence),
+    }),
+    "flashlight": ImportKind(FlashlightProblemDB, FlashlightProblemDTO, lambda row: {
+        "problem_statement": row.problem_statement,
+        "target": row.target,
+        "target_spans": find_occurrences(row.reading_content, row.target),
+    }),
+}
+
+
+@dataclass
+class ImportReport:
+    kind: str
+    rows: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    new_passages: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    errors: list[dict] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class ProblemImport:
+    """
+    Bulk import of one problem kind from NDJSON lines.
+
+    Rows are validated against the kind's create DTO and buffered; flush() inserts the buffered batch with
+    one executemany for the passages and one for the problems. A row is a duplicate when a problem with the
+    same statement on the same passage exists already or came earlier in the import, found with one lookup
+    per batch. The caller commits after each flush, so every batch is its own transaction.
+    """
+
+    def __init__(self, kind: str, batch_size: int = IMPORT_BATCH_SIZE):
+        self.kind = IMPORT_KINDS[kind]
+        self.batch_size = batch_size
+        self.report = ImportReport(kind=kind)
+        self._pending: list[tuple[str, BaseModel]] = []  # (passage hash, row)
+        self._started = time.monotonic()
+
+    def add_line(self, line_number: int, line: str | bytes) -> bool:
+        """Validate and buffer one line, True once a batch is ready to flush. Blank lines are skipped."""
+        if not line.strip():
+            return False
+        self.report.rows += 1
+        try:
+            row = self.kind.dto.model_validate_json(line)
+        except ValidationError as e:
+            self._reject(line_number, "; ".join(
+                f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in e.errors()
+            ))
+            return False
+        self._pending.append((hash_content(row.reading_content), row))
+        return len(self._pending) >= self.batch_size
+
+    def flush(self, session: Session) -> None:
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        model = self.kind.model
+
+        passages = {content_hash: row.reading_content for content_hash, row in pending}
+        known = set(session.scalars(
+            select(ReadingContentDB.content_hash).where(ReadingContentDB.content_hash.in_(passages))
+        ))
+        new = [{"content": content, "content_hash": content_hash, "token_index": token_offsets(content)}
+               for content_hash, content in passages.items() if content_hash not in known]
+        if new:
+            session.execute(sqlite_insert(ReadingContentDB).on_conflict_do_nothing(index_elements=["content_hash"]), new)
+        passage_ids = dict(session.execute(
+            select(ReadingContentDB.content_hash, ReadingContentDB.id)
+            .where(ReadingContentDB.content_hash.in_(passages))
+        ).all())
+
+        keys = {(row.problem_statement, passage_ids[content_hash]) for content_hash, row in pending}
+        seen = set(session.execute(
+            select(model.problem_statement, model.reading_content_id)
+            .where(tuple_(model.problem_statement, model.reading_content_id).in_(keys))
+        ).all())
+        rows = []
+        for content_hash, row in pending:
+            key = (row.problem_statement, passage_ids[content_hash])
+            if key in seen:
+                self.report.duplicates += 1
+                continue
+            seen.add(key)
+            rows.append({**self.kind.columns(row), "reading_content_id": key[1]})
+        if rows:
+            session.execute(insert(model), rows)
+
+        self.report.inserted += len(rows)
+        self.report.new_passages += len(new)
+        self.report.batches += 1
+
+    def finish(self) -> ImportReport:
+        self.report.seconds = round(time.monotonic() - self._started, 3)
+        return self.report
+
+    def _reject(self, line_number: int, message: str) -> None:
+        self.report.invalid += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append({"line": line_number, "error": message})
+
+
+async def aiter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, bytes]]:
+    """(line number, line) of a byte stream split on newlines, whatever the chunk boundaries"""
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line
+    if buffer:
+        yield line_number + 1, buffer
+
+
+async def import_stream(kind: str, chunks: AsyncIterable[bytes], batch_size: int = IMPORT_BATCH_SIZE) -> ImportReport:
+    """
+    Import an NDJSON byte stream, committing every batch.
+
+    Only reading the body happens on the event loop. Validation and building the answer indexes are CPU
+    bound, so every batch of lines is imported in a worker thread over its own sync session.
+    """
+    job = ProblemImport(kind, batch_size)
+    lines = []
+    async for line_number, line in aiter_lines(chunks):
+        lines.append((line_number, line))
+        if len(lines) >= batch_size:
+            await asyncio.to_thread(_import_batch, job, lines)
+            lines = []
+    await asyncio.to_thread(_import_batch, job, lines)
+    return job.finish()
+
+
+def _import_batch(job: ProblemImport, lines: list[tuple[int, bytes]]) -> None:
+    with SessionLocal() as session:
+        for line_number, line in lines:
+            job.add_line(line_number, line)
+        job.flush(session)
+        session.commit()
+
+
+def import_lines(session: Session, kind: str, lines, batch_size: int = IMPORT_BATCH_SIZE) -> ImportReport:
+    """Import NDJSON lines through a sync session, committing every batch"""
+    job = ProblemImport(kind, batch_size)
+    for line_number, line in enumerate(lines, start=1):
+        if job.add_line(line_number, line):
+            job.flush(session)
+            session.commit()
+    job.flush(session)
+    session.commit()
+    return job.finish()
@@ -1,11 +1,27 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from router import EvidenceProblem, FlashlightProblem, ReadingContent, User, Assistant
+from assistant.llm import close_openai_client
+from auth.auth import shutdown_hash_pool
+from model.Base import dispose_engines
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.request_metrics import ServerTimingMiddleware
+from router import EvidenceProblem, FlashlightProblem, ReadingContent, User, Assistant, Export
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shutdown_hash_pool()
+    await close_openai_client()
+    await dispose_engines()
+
+
 # --- API ROUTES ---
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -16,10 +32,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified", "Server-Timing"],
 )
+# Query counts and db, auth, serialization and llm timings of every request, see utils/request_metrics.py
+app.add_middleware(ServerTimingMiddleware)
 
 app.include_router(EvidenceProblem.router)
 app.include_router(FlashlightProblem.router)
 app.include_router(ReadingContent.router)
 app.include_router(User.router)
 app.include_router(Assistant.router)
+app.include_router(Export.router)
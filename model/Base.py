@@ -1,9 +1,94 @@
-from sqlalchemy import create_engine, Column, func, DateTime, Table, Integer, ForeignKey
-from sqlalchemy.orm import sessionmaker, declarative_base, declared_attr
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./db_local.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+from sqlalchemy import create_engine, Column, func, DateTime, Table, Integer, ForeignKey, Index, event, make_url, \
+    URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker, declarative_base, declared_attr, Session
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./db_local.db")
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or SQLALCHEMY_DATABASE_URL.replace(
+    "sqlite://", "sqlite+aiosqlite://", 1)
+
+# "async" serves requests through AsyncSession over aiosqlite,
+# "sync" keeps the pysqlite engine and runs each call in a worker thread.
+DB_MODE = os.getenv("DB_MODE", "async").lower()
+if DB_MODE not in ("async", "sync"):
+    raise ValueError(f"DB_MODE must be 'async' or 'sync', got {DB_MODE!r}")
+
+# SQLite engine profile, applied to every new connection. Set a value to an empty string to keep SQLite's default.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # negative means KiB, so 64 MiB
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Split reads onto a pool of read-only connections and funnel every write through a single connection,
+# so catalog reads never queue behind the writer and writers never fight over the SQLite lock.
+DB_READ_WRITE_SPLIT = os.getenv("DB_READ_WRITE_SPLIT", "0").lower() in ("1", "true", "yes")
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 8))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+
+
+def _is_sqlite_file(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def _read_only_url(url: URL) -> URL:
+    return url.set(database=f"file:{url.database}", query={**url.query, "mode": "ro", "uri": "true"})
+
+
+def _apply_sqlite_pragmas(sync_engine, read_only: bool = False) -> None:
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            # journal_mode is a property of the database file, only the writer may change it
+            if not value or (read_only and name == "journal_mode"):
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _create_engines(url: URL, read_only: bool = False, pool_size: int | None = None):
+    sync_kwargs = {}
+    async_kwargs = {}
+    if url.get_backend_name() == "sqlite":
+        sync_kwargs["connect_args"] = {"check_same_thread": False}
+    if pool_size is not None:
+        for kwargs in (sync_kwargs, async_kwargs):
+            kwargs.update(pool_size=pool_size, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT)
+
+    async_url = make_url(ASYNC_SQLALCHEMY_DATABASE_URL)
+    if read_only:
+        url, async_url = _read_only_url(url), _read_only_url(async_url)
+    sync_engine = create_engine(url, **sync_kwargs)
+    async_engine = create_async_engine(async_url, **async_kwargs)
+    if url.get_backend_name() == "sqlite":
+        _apply_sqlite_pragmas(sync_engine, read_only)
+        _apply_sqlite_pragmas(async_engine.sync_engine, read_only)
+    return sync_engine, async_engine
+
+
+_database_url = make_url(SQLALCHEMY_DATABASE_URL)
+_split = DB_READ_WRITE_SPLIT and _is_sqlite_file(_database_url)
+
+engine, async_engine = _create_engines(_database_url, pool_size=1 if _split else None)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if _split:
+    read_engine, async_read_engine = _create_engines(_database_url, read_only=True, pool_size=DB_READ_POOL_SIZE)
+else:
+    read_engine, async_read_engine = engine, async_engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -16,7 +101,10 @@ class TimestampMixin:
 
     @declared_attr
     def updated_at(cls):
-        return Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+        # set in Python rather than by SQLite's CURRENT_TIMESTAMP, whose whole seconds would let two quick
+        # updates share a value, and the row version behind the ETags must change with every write
+        return Column(DateTime(timezone=True), server_default=func.now(),
+                      onupdate=lambda: datetime.now(timezone.utc), nullable=False)
 
 
 def reset_db():
@@ -31,16 +119,133 @@ def get_db():
     finally:
         db.close()
 
+
+class SyncSessionAdapter:
+    """
+    Expose the awaitable subset of AsyncSession on top of a sync Session.
+
+    Used when DB_MODE=sync so the routers can be written once against the async API,
+    while the blocking pysqlite calls run in a worker thread instead of on the event loop.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None):
+        return await asyncio.to_thread(self.sync_session.execute, statement, params)
+
+    async def scalar(self, statement, params=None):
+        return await asyncio.to_thread(self.sync_session.scalar, statement, params)
+
+    async def scalars(self, statement, params=None):
+        return await asyncio.to_thread(self.sync_session.scalars, statement, params)
+
+    async def get(self, entity, ident):
+        return await asyncio.to_thread(self.sync_session.get, entity, ident)
+
+    async def delete(self, instance) -> None:
+        await asyncio.to_thread(self.sync_session.delete, instance)
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        await asyncio.to_thread(self.sync_session.refresh, instance, attribute_names)
+
+    async def flush(self) -> None:
+        await asyncio.to_thread(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await asyncio.to_thread(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await asyncio.to_thread(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, self.sync_session, *args, **kwargs)
+
+    async def stream(self, statement, params=None):
+        return _SyncStreamingResult(await asyncio.to_thread(self.sync_session.execute, statement, params))
+
+
+class _SyncStreamingResult:
+    """The partitions() part of AsyncResult, fetching each partition of a sync Result in a worker thread"""
+
+    def __init__(self, result):
+        self._result = result
+
+    async def partitions(self, size: int | None = None):
+        partitions = self._result.partitions(size)
+        while (partition := await asyncio.to_thread(next, partitions, None)) is not None:
+            yield partition
+
+
+def _session_scope(async_factory: async_sessionmaker, sync_factory: sessionmaker):
+    @asynccontextmanager
+    async def session_scope():
+        """
+        Session with the AsyncSession API, picked by DB_MODE at startup.
+        """
+        if DB_MODE == "async":
+            async with async_factory() as db:
+                yield db
+        else:
+            db = SyncSessionAdapter(sync_factory(expire_on_commit=False))
+            try:
+                yield db
+            finally:
+                await db.close()
+
+    return session_scope
+
+
+def _session_dependency(session_scope):
+    async def get_session():
+        """
+        Request-scoped session with the AsyncSession API, picked by DB_MODE at startup.
+        """
+        async with session_scope() as db:
+            yield db
+
+    return get_session
+
+
+# For work outside a request, e.g. rebuilding the catalog snapshot
+async_session_scope = _session_scope(AsyncSessionLocal, SessionLocal)
+async_read_session_scope = _session_scope(AsyncReadSessionLocal, ReadSessionLocal) if _split else async_session_scope
+
+get_async_db = _session_dependency(async_session_scope)
+# Without the split both names are the same dependency, so FastAPI hands a request one shared session.
+get_async_read_db = _session_dependency(async_read_session_scope) if _split else get_async_db
+
+
+async def dispose_engines() -> None:
+    await async_engine.dispose()
+    engine.dispose()
+    if _split:
+        await async_read_engine.dispose()
+        read_engine.dispose()
+
+# The composite primary key serves "has this user solved X" and "what has this user solved",
+# the reverse index serves lookups by problem (deletes, solved_by_users).
 user_evidence_problem_association = Table(
     'user_evidence_problem_association',
     Base.metadata,
-    Column('user_id', Integer, ForeignKey('user_table.id')),
-    Column('evidence_problem_id', Integer, ForeignKey('evidence_problem_table.id'))
+    Column('user_id', Integer, ForeignKey('user_table.id'), primary_key=True),
+    Column('evidence_problem_id', Integer, ForeignKey('evidence_problem_table.id'), primary_key=True),
+    Index('ix_user_evidence_problem_association_problem_user', 'evidence_problem_id', 'user_id'),
 )
 
 user_flashlight_problem_association = Table(
     'user_flashlight_problem_association',
     Base.metadata,
-    Column('user_id', Integer, ForeignKey('user_table.id')),
-    Column('flashlight_problem_id', Integer, ForeignKey('flashlight_problem_table.id'))
-)
\ No newline at end of file
+    Column('user_id', Integer, ForeignKey('user_table.id'), primary_key=True),
+    Column('flashlight_problem_id', Integer, ForeignKey('flashlight_problem_table.id'), primary_key=True),
+    Index('ix_user_flashlight_problem_association_problem_user', 'flashlight_problem_id', 'user_id'),
+)
@@ -0,0 +1,227 @@
+import asyncio
+import dataclasses
+import json
+import os
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+
+from pydantic import BaseModel
+from sqlalchemy import select, func
+from sqlalchemy.orm import noload, Session
+
+from model.Base import ReadSessionLocal, async_read_session_scope
+from model.ReadingContent import ReadingContentDB
+from utils.cache import TTLCache
+from utils.conditional import make_etag, row_version
+
+# A snapshot is brought up to date at once after a write through this process. Writes made elsewhere (other
+# workers, scripts) show up once it is older than this many seconds: a count and max(updated_at) probe then
+# decides in the background whether anything changed, and only the rows that did are rendered again.
+CATALOG_SNAPSHOT_MAX_AGE = float(os.getenv("CATALOG_SNAPSHOT_MAX_AGE", 30))
+# Encoded passages kept in memory for the catalog responses that include them. Passages are immutable,
+# the bound is only there to keep a large catalog out of every worker's memory.
+CATALOG_PASSAGE_CACHE_SIZE = int(os.getenv("CATALOG_PASSAGE_CACHE_SIZE", 2048))
+# Problems rendered per query when only some rows changed
+_RENDER_BATCH = 500
+
+# Fields rendered separately from the rest of a problem, see CatalogSnapshot.problem_json
+_SPLICED_FIELDS = {"reading_content", "solved"}
+
+_passage_cache = TTLCache(maxsize=CATALOG_PASSAGE_CACHE_SIZE, ttl=float("inf"))
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogEntry:
+    head: bytes  # the problem's JSON object without the spliced fields and the closing brace
+    reading_content_id: int
+    updated_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogSnapshot:
+    """
+    Read-only copy of one problem catalog, pre-rendered as JSON. Never mutated: a refresh makes a new one.
+    Passages are not part of it, the caller passes them in encoded, see Catalog.passages.
+    """
+    version: int
+    built_at: float
+    ids: tuple[int, ...]  # ascending
+    entries: dict[int, CatalogEntry]
+    # row count and newest updated_at of the table when the snapshot was taken
+    probe: tuple
+
+    def problem_json(self, problem_id: int, passage: bytes | None = None, solved: bool | None = None,
+                     exclude_none: bool = True) -> bytes:
+        entry = self.entries[problem_id]
+        parts = [entry.head]
+        if passage is not None:
+            parts += [b',"reading_content":', passage]
+        if solved is not None:
+            parts.append(b',"solved":true' if solved else b',"solved":false')
+        elif not exclude_none:
+            parts.append(b',"solved":null')
+        parts.append(b"}")
+        return b"".join(parts)
+
+    def list_json(self, ids, passages: dict[int, bytes] | None = None, solved_ids: set[int] | None = None) -> bytes:
+        return b"[" + b",".join(
+            self.problem_json(
+                problem_id,
+                None if passages is None else passages[self.entries[problem_id].reading_content_id],
+                None if solved_ids is None else problem_id in solved_ids,
+            )
+            for problem_id in ids
+        ) + b"]"
+
+    def ascending(self, limit: int, offset: int = 0, after_id: int | None = None) -> tuple[int, ...]:
+        start = offset if after_id is None else bisect_right(self.ids, after_id)
+        return self.ids[start:start + limit]
+
+    def descending(self, limit: int, offset: int = 0, before_id: int | None = None) -> tuple[int, ...]:
+        end = len(self.ids) - offset if before_id is None else bisect_left(self.ids, before_id)
+        return tuple(reversed(self.ids[max(end - limit, 0):max(end, 0)]))
+
+    def validators(self, problem_id: int) -> tuple[str, datetime]:
+        updated_at = self.entries[problem_id].updated_at
+        return make_etag(problem_id, row_version(updated_at)), updated_at
+
+    def page_validators(self, ids) -> tuple[str, datetime | None]:
+        """ETag and Last-Modified of one page: its id range, its size and the newest row version in it"""
+        last_modified = max((self.entries[problem_id].updated_at for problem_id in ids), default=None)
+        version = row_version(last_modified) if last_modified is not None else 0
+        return make_etag("page", min(ids, default=None), max(ids, default=None), len(ids), version), last_modified
+
+
+class Catalog:
+    """
+    Keeps the current snapshot of one problem table and refreshes it when stale.
+
+    The admin write routes call invalidate() after they commit. The next read waits for a refresh,
+    and concurrent readers share it. Refreshes run in a worker thread and render only the problems whose
+    updated_at changed; the finished snapshot replaces the old one in a single assignment.
+    """
+
+    def __init__(self, model, response_dto: type[BaseModel]):
+        self.model = model
+        self.response_dto = response_dto
+        self.version = 0
+        self._snapshot: CatalogSnapshot | None = None
+        self._build_task: asyncio.Task | None = None
+        self._build_version = -1
+
+    def invalidate(self) -> None:
+        self.version += 1
+
+    async def snapshot(self) -> CatalogSnapshot:
+        current = self._snapshot
+        if current is not None and current.version == self.version:
+            if time.monotonic() - current.built_at > CATALOG_SNAPSHOT_MAX_AGE:
+                self._start_build()
+            return current
+        while True:
+            version = self.version
+            snapshot = await asyncio.shield(self._start_build())
+            if snapshot.version >= version:
+                return snapshot
+
+    async def passages(self, snapshot: CatalogSnapshot, ids) -> dict[int, bytes]:
+        """The encoded passages of the problems ids, by reading_content_id"""
+        wanted = {snapshot.entries[problem_id].reading_content_id for problem_id in ids}
+        found = {}
+        for content_id in wanted:
+            passage = _passage_cache.get(content_id)
+            if passage is not None:
+                found[content_id] = passage
+        missing = wanted - found.keys()
+        if missing:
+            async with async_read_session_scope() as db:
+                rows = (await db.execute(
+                    select(ReadingContentDB.id, ReadingContentDB.content).where(ReadingContentDB.id.in_(missing))
+                )).all()
+            for content_id, content in rows:
+                found[content_id] = json.dumps(content, ensure_ascii=False).encode()
+                _passage_cache.set(content_id, found[content_id])
+        return found
+
+    async def list_json(self, snapshot: CatalogSnapshot, ids, include_passage: bool = True,
+                        solved_ids: set[int] | None = None) -> bytes:
+        passages = await self.passages(snapshot, ids) if include_passage else None
+        return snapshot.list_json(ids, passages, solved_ids)
+
+    async def problem_json(self, snapshot: CatalogSnapshot, problem_id: int, exclude_none: bool = True) -> bytes:
+        passages = await self.passages(snapshot, (problem_id,))
+        return snapshot.problem_json(problem_id, passages[snapshot.entries[problem_id].reading_content_id],
+                                     exclude_none=exclude_none)
+
+    async def problem(self, snapshot: CatalogSnapshot, problem_id: int) -> dict:
+        return json.loads(await self.problem_json(snapshot, problem_id))
+
+    def _start_build(self) -> asyncio.Task:
+        task = self._build_task
+        if task is None or task.done() or self._build_version != self.version:
+            # a write through this process is known, only an age refresh needs the probe to find one
+            force = self._build_version != self.version
+            self._build_version = self.version
+            task = asyncio.get_running_loop().create_task(self._build(self.version, force))
+            task.add_done_callback(_report_build_failure)
+            self._build_task = task
+        return task
+
+    async def _build(self, version: int, force: bool) -> CatalogSnapshot:
+        snapshot = await asyncio.to_thread(self._refresh, version, self._snapshot, force)
+        if self._snapshot is None or self._snapshot.version <= version:
+            self._snapshot = snapshot
+        return snapshot
+
+    def _refresh(self, version: int, previous: CatalogSnapshot | None, force: bool) -> CatalogSnapshot:
+        model = self.model
+        with ReadSessionLocal() as session:
+            if session.get_bind().dialect.name == "sqlite":
+                # pysqlite leaves SELECTs outside a transaction, so each statement would read its own snapshot
+                # and a problem deleted between the scan and the render would be listed without an entry
+                session.connection().exec_driver_sql("BEGIN")
+            probe = tuple(session.execute(select(func.count(), func.max(model.updated_at))).one())
+            if previous is not None and not force and probe == previous.probe:
+                return dataclasses.replace(previous, version=version, built_at=time.monotonic())
+
+            row_versions = dict(session.execute(select(model.id, model.updated_at).order_by(model.id.asc())).all())
+            old = previous.entries if previous is not None else {}
+            stale = [problem_id for problem_id, updated_at in row_versions.items()
+                     if problem_id not in old or old[problem_id].updated_at != updated_at]
+            rendered = self._render(session, stale, everything=len(stale) == len(row_versions))
+
+        entries = {problem_id: rendered.get(problem_id) or old[problem_id] for problem_id in row_versions
+                   if problem_id in rendered or problem_id in old}
+        return CatalogSnapshot(
+            version=version,
+            built_at=time.monotonic(),
+            ids=tuple(entries),
+            entries=entries,
+            probe=probe,
+        )
+
+    def _render(self, session: Session, ids: list[int], everything: bool) -> dict[int, CatalogEntry]:
+        model = self.model
+        query = select(model).options(noload(model.passage))
+        if everything:
+            batches = session.scalars(query.execution_options(yield_per=_RENDER_BATCH)).partitions()
+        else:
+            batches = (session.scalars(query.where(model.id.in_(ids[start:start + _RENDER_BATCH]))).all()
+                       for start in range(0, len(ids), _RENDER_BATCH))
+        rendered = {}
+        for problems in batches:
+            for problem in problems:
+                rendered[problem.id] = CatalogEntry(
+                    head=self.response_dto.model_validate(problem).model_dump_json(exclude=_SPLICED_FIELDS)
+                    .encode()[:-1],
+                    reading_content_id=problem.reading_content_id,
+                    updated_at=problem.updated_at,
+                )
+        return rendered
+
+
+def _report_build_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Catalog snapshot rebuild failed: {task.exception()!r}")
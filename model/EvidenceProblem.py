@@ -1,22 +1,36 @@
 from typing import List
 
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, event, inspect
+from sqlalchemy.orm import Mapped, Session, relationship
 
 from model.Base import Base, TimestampMixin, user_evidence_problem_association
+from model.ReadingContent import PassageMixin
 from model.User import UserDB
+from utils.text_index import find_token_range
 
-class EvidenceProblemDB(Base,TimestampMixin):
+class EvidenceProblemDB(Base,TimestampMixin,PassageMixin):
     __tablename__ = "evidence_problem_table"
     id: Mapped[int] = Column(Integer, primary_key=True, index=True)
     problem_statement: Mapped[str] = Column(String,nullable=False)
     evidence: Mapped[str] = Column(String,nullable=False)
     options: Mapped[List[str]] = Column(JSON, nullable=False)
     correct_option: Mapped[int] = Column(Integer,nullable=False)
+    # [first, last) tokens of the evidence in the passage's token_index, None when it does not occur,
+    # kept up to date on flush for highlight grading
+    evidence_tokens: Mapped[List[int] | None] = Column(JSON, nullable=True)
 
     solved_by_users: Mapped[List["UserDB"]] = relationship(
         "UserDB",
         secondary=user_evidence_problem_association,
         back_populates="evidence_problems_solved",
     )
-    reading_content:Mapped[str] = Column(String,nullable=False)
+
+
+@event.listens_for(Session, "before_flush")
+def _index_evidence(session: Session, flush_context, instances) -> None:
+    # registered after the passage interning listener, so a new passage is already attached here
+    for instance in (*session.new, *session.dirty):
+        if isinstance(instance, EvidenceProblemDB):
+            state = inspect(instance)
+            if state.attrs.evidence.history.has_changes() or state.attrs.passage.history.has_changes():
+                instance.evidence_tokens = find_token_range(instance.reading_content, instance.evidence)
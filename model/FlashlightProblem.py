@@ -1,28 +1,43 @@
 from typing import List
 
-from sqlalchemy import Column, Integer, String
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy import Column, Integer, String, JSON, event, inspect
+from sqlalchemy.orm import Mapped, Session, relationship
 
 from model.Base import Base, TimestampMixin, user_flashlight_problem_association
+from model.ReadingContent import PassageMixin
 from model.User import UserDB
+from utils.text_index import find_occurrences
 
-class FlashlightProblemDB(Base, TimestampMixin):
+class FlashlightProblemDB(Base, TimestampMixin, PassageMixin):
     """
     Database model for flashlight drill problems.
 
     In flashlight drills, users must find and highlight specific target text
     within a reading passage, typically under time pressure (15 seconds).
     This exercises rapid scanning and keyword location skills.
+    The passage is stored once in reading_content_table, see PassageMixin.
+    target_spans holds the [start, end] offsets of every occurrence of the target in the passage,
+    ignoring case and spacing. It is kept up to date on flush, so grading never scans the passage.
     """
     __tablename__ = "flashlight_problem_table"
 
     id: Mapped[int] = Column(Integer, primary_key=True, index=True)
     problem_statement: Mapped[str] = Column(String, nullable=False)
     target: Mapped[str] = Column(String, nullable=False)
-    reading_content: Mapped[str] = Column(String, nullable=False)
+    target_spans: Mapped[List[List[int]]] = Column(JSON, nullable=False, default=list, server_default="[]")
 
     solved_by_users: Mapped[List["UserDB"]] = relationship(
         "UserDB",
         secondary=user_flashlight_problem_association,
         back_populates="flashlight_problems_solved",
     )
+
+
+@event.listens_for(Session, "before_flush")
+def _index_target_spans(session: Session, flush_context, instances) -> None:
+    # registered after the passage interning listener, so a new passage is already attached here
+    for instance in (*session.new, *session.dirty):
+        if isinstance(instance, FlashlightProblemDB):
+            state = inspect(instance)
+            if state.attrs.target.history.has_changes() or state.attrs.passage.history.has_changes():
+                instance.target_spans = find_occurrences(instance.reading_content, instance.target)
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.orm import Mapped
+
+from model.Base import Base, TimestampMixin
+
+
+class HintCacheDB(Base, TimestampMixin):
+    """
+    Persistent tier of the assistant hint cache, keyed by the request fingerprint (see assistant/hints.py).
+    Rows without expires_at never expire.
+    """
+    __tablename__ = "assistant_hint_table"
+    fingerprint: Mapped[str] = Column(String, primary_key=True)
+    situation: Mapped[str] = Column(String, nullable=False)
+    suggestion: Mapped[str] = Column(String, nullable=False)
+    expires_at: Mapped[datetime | None] = Column(DateTime(timezone=True), nullable=True)
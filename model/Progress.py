@@ -0,0 +1,129 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DDL, event, text, Connection, Select, select, func
+from sqlalchemy.orm import Mapped
+
+from model.Base import Base, user_evidence_problem_association, user_flashlight_problem_association
+from model.EvidenceProblem import EvidenceProblemDB
+from model.FlashlightProblem import FlashlightProblemDB
+
+
+class UserProgressDB(Base):
+    """
+    Denormalized solved counters of one user, so progress reads are a primary key lookup.
+    Maintained by triggers on the association tables, rebuilt by script/repair_progress.py.
+    """
+    __tablename__ = "user_progress_table"
+    user_id: Mapped[int] = Column(Integer, ForeignKey("user_table.id"), primary_key=True)
+    solved_evidence_count: Mapped[int] = Column(Integer, nullable=False, default=0, server_default="0")
+    solved_flashlight_count: Mapped[int] = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class CatalogCountDB(Base):
+    """
+    Number of rows in each problem table, maintained by triggers on those tables.
+    """
+    __tablename__ = "catalog_count_table"
+    name: Mapped[str] = Column(String, primary_key=True)
+    count: Mapped[int] = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+EVIDENCE_CATALOG = "evidence_problem"
+FLASHLIGHT_CATALOG = "flashlight_problem"
+
+# catalog name -> (problem table, association table, association problem column, progress column)
+PROGRESS_COUNTERS = {
+    EVIDENCE_CATALOG: (
+        EvidenceProblemDB.__table__,
+        user_evidence_problem_association,
+        "evidence_problem_id",
+        "solved_evidence_count",
+    ),
+    FLASHLIGHT_CATALOG: (
+        FlashlightProblemDB.__table__,
+        user_flashlight_problem_association,
+        "flashlight_problem_id",
+        "solved_flashlight_count",
+    ),
+}
+
+_PROGRESS = UserProgressDB.__tablename__
+_CATALOG = CatalogCountDB.__tablename__
+
+
+def _problem_table_ddl(catalog: str, problem_table: str, association: str, problem_column: str) -> list[str]:
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {problem_table}_count_ai AFTER INSERT ON {problem_table} BEGIN "
+        f"INSERT INTO {_CATALOG}(name, count) VALUES ('{catalog}', 1) "
+        f"ON CONFLICT(name) DO UPDATE SET count = count + 1; END",
+        # removing a problem also un-solves it for everyone, which the association triggers count down
+        f"CREATE TRIGGER IF NOT EXISTS {problem_table}_count_ad AFTER DELETE ON {problem_table} BEGIN "
+        f"DELETE FROM {association} WHERE {problem_column} = old.id; "
+        f"UPDATE {_CATALOG} SET count = count - 1 WHERE name = '{catalog}'; END",
+    ]
+
+
+def _association_ddl(association: str, progress_column: str) -> list[str]:
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {association}_progress_ai AFTER INSERT ON {association} BEGIN "
+        f"INSERT INTO {_PROGRESS}(user_id, {progress_column}) VALUES (new.user_id, 1) "
+        f"ON CONFLICT(user_id) DO UPDATE SET {progress_column} = {progress_column} + 1; END",
+        f"CREATE TRIGGER IF NOT EXISTS {association}_progress_ad AFTER DELETE ON {association} BEGIN "
+        f"UPDATE {_PROGRESS} SET {progress_column} = {progress_column} - 1 WHERE user_id = old.user_id; END",
+    ]
+
+
+def _counter_ddl() -> list[tuple[object, list[str]]]:
+    ddl = []
+    for catalog, (problem_table, association, problem_column, progress_column) in PROGRESS_COUNTERS.items():
+        ddl.append((problem_table, _problem_table_ddl(catalog, problem_table.name, association.name, problem_column)))
+        ddl.append((association, _association_ddl(association.name, progress_column)))
+    return ddl
+
+
+for _table, _statements in _counter_ddl():
+    for _statement in _statements:
+        event.listen(_table, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+def create_progress_triggers(connection: Connection) -> None:
+    """Create the counter triggers if they are missing, e.g. on a database created before the counters existed"""
+    for _, statements in _counter_ddl():
+        for statement in statements:
+            connection.execute(text(statement))
+
+
+def drop_progress_triggers(connection: Connection) -> None:
+    """Drop the counter triggers, e.g. while a problem table is rebuilt by a migration"""
+    for problem_table, association, _, _ in PROGRESS_COUNTERS.values():
+        for trigger in (f"{problem_table.name}_count_ai", f"{problem_table.name}_count_ad",
+                        f"{association.name}_progress_ai", f"{association.name}_progress_ad"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+
+
+def recompute_progress(connection: Connection) -> None:
+    """Rebuild both counter tables from the problem and association tables"""
+    connection.execute(text(f"DELETE FROM {_CATALOG}"))
+    connection.execute(text(f"DELETE FROM {_PROGRESS}"))
+    for catalog, (problem_table, _, _, _) in PROGRESS_COUNTERS.items():
+        connection.execute(
+            text(f"INSERT INTO {_CATALOG}(name, count) SELECT :name, COUNT(*) FROM {problem_table.name}"),
+            {"name": catalog},
+        )
+
+    evidence_association = PROGRESS_COUNTERS[EVIDENCE_CATALOG][1].name
+    flashlight_association = PROGRESS_COUNTERS[FLASHLIGHT_CATALOG][1].name
+    connection.execute(text(
+        f"INSERT INTO {_PROGRESS}(user_id, solved_evidence_count, solved_flashlight_count) "
+        f"SELECT user_table.id, "
+        f"(SELECT COUNT(*) FROM {evidence_association} a WHERE a.user_id = user_table.id), "
+        f"(SELECT COUNT(*) FROM {flashlight_association} a WHERE a.user_id = user_table.id) "
+        f"FROM user_table"
+    ))
+
+
+def track_status_query(catalog: str, user_id: int) -> Select:
+    """Select (total problems, problems solved by the user) for one catalog as two primary key lookups"""
+    progress_column = UserProgressDB.__table__.c[PROGRESS_COUNTERS[catalog][3]]
+    return select(
+        func.coalesce(select(CatalogCountDB.count).where(CatalogCountDB.name == catalog).scalar_subquery(), 0),
+        func.coalesce(select(progress_column).where(UserProgressDB.user_id == user_id).scalar_subquery(), 0),
+    )
@@ -1,20 +1,36 @@
+import hashlib
 from typing import List, TYPE_CHECKING
 
-from sqlalchemy import Column, Integer, String, DateTime, func
-from sqlalchemy.orm import relationship, Mapped
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, select, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import relationship, Mapped, declared_attr, Session, deferred
+from sqlalchemy.orm.attributes import flag_dirty
 
 from model.Base import Base, TimestampMixin
+from utils.text_index import token_offsets
 if TYPE_CHECKING:
     from model.MCQuestion import MultiChoiceQuestionDB
 
 
+def hash_content(content: str) -> str:
+    """Content address of a passage: the sha256 hex digest of its UTF-8 text"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
 class ReadingContentDB(Base, TimestampMixin):
     """
     Database model for reading content, reading content can be very short paragraph to a full reading exam.
+
+    Rows are content-addressed by content_hash: a passage is stored once however many problems use it,
+    and the text behind an id never changes.
     """
     __tablename__ = "reading_content_table"
     id:Mapped[int] = Column(Integer, primary_key=True, index=True)
-    content:Mapped[str] = Column(String)
+    content:Mapped[str] = Column(String, nullable=False)
+    content_hash:Mapped[str] = Column(String, nullable=False, unique=True, index=True)
+    # Token offsets of the content (see token_offsets), stored once for every problem on the passage to grade
+    # highlights against. Deferred: only the grading route reads it.
+    token_index: Mapped[dict | None] = deferred(Column(JSON, nullable=True))
 
     # multi_choice_questions: Mapped[List["MultiChoiceQuestionDB"]] = relationship(
     #     "MultiChoiceQuestionDB",
@@ -33,3 +49,57 @@ class ReadingContentDB(Base, TimestampMixin):
     # """
     # One reading passage can have multiple evidence problems associated with it
     # """
+
+
+def intern_passage(session: Session, content: str) -> int:
+    """
+    Return the id of the stored passage with exactly this text, storing it first if it is new.
+    Safe against a concurrent writer storing the same text.
+    """
+    content_hash = hash_content(content)
+    session.execute(
+        sqlite_insert(ReadingContentDB)
+        .values(content=content, content_hash=content_hash, token_index=token_offsets(content))
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+    )
+    return session.scalar(select(ReadingContentDB.id).where(ReadingContentDB.content_hash == content_hash))
+
+
+class PassageMixin:
+    """
+    Mixin for problems that are asked about a reading passage.
+
+    The passage lives once in reading_content_table and the problem keeps its id. Assigning text to
+    ``reading_content`` stores or reuses the matching passage when the session flushes.
+    """
+    _pending_reading_content: str | None = None
+
+    @declared_attr
+    def reading_content_id(cls):
+        return Column(Integer, ForeignKey("reading_content_table.id"), nullable=False, index=True)
+
+    @declared_attr
+    def passage(cls):
+        # one extra SELECT ... IN per list of problems, however many of them share a passage
+        return relationship("ReadingContentDB", lazy="selectin")
+
+    @property
+    def reading_content(self) -> str | None:
+        """The passage text, None when the passage was not loaded (see noload on list endpoints)"""
+        if self._pending_reading_content is not None:
+            return self._pending_reading_content
+        return self.passage.content if self.passage is not None else None
+
+    @reading_content.setter
+    def reading_content(self, content: str) -> None:
+        self._pending_reading_content = content
+        flag_dirty(self)
+
+
+@event.listens_for(Session, "before_flush")
+def _intern_pending_passages(session: Session, flush_context, instances) -> None:
+    for instance in (*session.new, *session.dirty):
+        if isinstance(instance, PassageMixin) and instance._pending_reading_content is not None:
+            content_id = intern_passage(session, instance._pending_reading_content)
+            instance.passage = session.get(ReadingContentDB, content_id)
+            instance._pending_reading_content = None
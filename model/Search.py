@@ -0,0 +1,115 @@
+import re
+
+from sqlalchemy import DDL, event, table, column, text, Connection
+from sqlalchemy.sql.elements import ColumnElement
+
+from model.EvidenceProblem import EvidenceProblemDB
+from model.FlashlightProblem import FlashlightProblemDB
+from model.ReadingContent import ReadingContentDB
+
+# The passage text lives in reading_content_table, so the indexed value is looked up by id.
+# Passages are content-addressed and never change under an id, which keeps the 'delete' values exact.
+_PASSAGE = f"(SELECT content FROM {ReadingContentDB.__tablename__} WHERE id = {{row}}.reading_content_id)"
+
+# Contentless FTS5 indexes over the problem tables, kept in sync by triggers.
+# fts table name -> (source table, fts column -> value expression over {row}, bm25 column weights)
+SEARCH_INDEXES = {
+    "evidence_problem_fts": (
+        EvidenceProblemDB.__tablename__,
+        {"problem_statement": "{row}.problem_statement", "evidence": "{row}.evidence", "reading_content": _PASSAGE},
+        (10.0, 5.0, 1.0),
+    ),
+    "flashlight_problem_fts": (
+        FlashlightProblemDB.__tablename__,
+        {"problem_statement": "{row}.problem_statement", "target": "{row}.target", "reading_content": _PASSAGE},
+        (10.0, 5.0, 1.0),
+    ),
+}
+
+evidence_problem_fts = table("evidence_problem_fts", column("rowid"), column("rank"), column("evidence_problem_fts"))
+flashlight_problem_fts = table("flashlight_problem_fts", column("rowid"), column("rank"),
+                               column("flashlight_problem_fts"))
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+_ROW_COLUMN_PATTERN = re.compile(r"\{row}\.(\w+)")
+
+
+def _values(columns: dict[str, str], row: str) -> str:
+    return ", ".join(expression.format(row=row) for expression in columns.values())
+
+
+def _index_ddl(fts: str, source: str, columns: dict[str, str], weights: tuple[float, ...]) -> list[str]:
+    cols = ", ".join(columns)
+    new_values = _values(columns, "new")
+    old_values = _values(columns, "old")
+    # the source columns the indexed values are computed from
+    watched = ", ".join(dict.fromkeys(_ROW_COLUMN_PATTERN.findall(" ".join(columns.values()))))
+    bm25 = ", ".join(str(w) for w in weights)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='', tokenize='unicode61 remove_diacritics 2')",
+        # the hidden rank column orders by bm25 with these per-column weights
+        f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', 'bm25({bm25})')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {watched} ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def _trigger_names(fts: str) -> list[str]:
+    return [f"{fts}_ai", f"{fts}_ad", f"{fts}_au"]
+
+
+for _fts, (_source, _columns, _weights) in SEARCH_INDEXES.items():
+    _source_table = {
+        EvidenceProblemDB.__tablename__: EvidenceProblemDB.__table__,
+        FlashlightProblemDB.__tablename__: FlashlightProblemDB.__table__,
+    }[_source]
+    for _statement in _index_ddl(_fts, _source, _columns, _weights):
+        event.listen(_source_table, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+    # the triggers go away with the source table, the virtual table does not
+    event.listen(_source_table, "after_drop", DDL(f"DROP TABLE IF EXISTS {_fts}").execute_if(dialect="sqlite"))
+
+
+def create_search_indexes(connection: Connection) -> None:
+    """Create the FTS tables and triggers if they are missing, e.g. on a database created before search existed"""
+    for fts, (source, columns, weights) in SEARCH_INDEXES.items():
+        for statement in _index_ddl(fts, source, columns, weights):
+            connection.execute(text(statement))
+
+
+def drop_search_indexes(connection: Connection) -> None:
+    """Drop the FTS tables and their triggers, e.g. before the index layout changes"""
+    for fts in SEARCH_INDEXES:
+        for trigger in _trigger_names(fts):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {fts}"))
+
+
+def rebuild_search_indexes(connection: Connection) -> None:
+    """Re-read every source row into the FTS tables"""
+    for fts, (source, columns, _) in SEARCH_INDEXES.items():
+        # contentless tables cannot 'rebuild' themselves, so empty and refill them
+        connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('delete-all')"))
+        connection.execute(text(
+            f"INSERT INTO {fts}(rowid, {', '.join(columns)}) SELECT id, {_values(columns, source)} FROM {source}"
+        ))
+
+
+def to_fts_query(q: str) -> str | None:
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix.
+    Words are quoted so user input can never be parsed as FTS syntax. Returns None when q has no words.
+    """
+    tokens = _TOKEN_PATTERN.findall(q)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def fts_match(fts_table, q: str) -> ColumnElement[bool]:
+    return fts_table.c[fts_table.name].match(q)
@@ -43,14 +43,6 @@ class UserDB(Base,TimestampMixin):
     #     cascade="all, delete-orphan",
     # )
 
-    @property
-    def solved_evidence_count(self) -> int:
-        return len(self.evidence_problems_solved)
-
-    @property
-    def solved_flashlight_count(self) -> int:
-        return len(self.flashlight_problems_solved)
-
 
 
 
@@ -1,17 +1,28 @@
 # Import all models so they're registered with Base.metadata
 # This is required for SQLAlchemy to create all tables correctly
-from model.Base import Base, engine, SessionLocal, get_db, reset_db, TimestampMixin
+from model.Base import Base, engine, SessionLocal, get_db, reset_db, TimestampMixin, \
+    async_engine, AsyncSessionLocal, get_async_db, get_async_read_db, dispose_engines
 from model.User import UserDB
 from model.EvidenceProblem import EvidenceProblemDB
 from model.FlashlightProblem import FlashlightProblemDB
 from model.ReadingContent import ReadingContentDB
 from model.MCQuestion import MultiChoiceQuestionDB
+from model.HintCache import HintCacheDB
+# Registers the FTS5 search index DDL on the problem tables
+from model.Search import create_search_indexes, rebuild_search_indexes
+# Registers the progress counter tables and their triggers
+from model.Progress import UserProgressDB, CatalogCountDB, create_progress_triggers, recompute_progress
 
 __all__ = [
     "Base",
     "engine",
     "SessionLocal",
     "get_db",
+    "async_engine",
+    "AsyncSessionLocal",
+    "get_async_db",
+    "get_async_read_db",
+    "dispose_engines",
     "reset_db",
     "TimestampMixin",
     "UserDB",
@@ -19,4 +30,11 @@ __all__ = [
     "FlashlightProblemDB",
     "ReadingContentDB",
     "MultiChoiceQuestionDB",
+    "HintCacheDB",
+    "create_search_indexes",
+    "rebuild_search_indexes",
+    "UserProgressDB",
+    "CatalogCountDB",
+    "create_progress_triggers",
+    "recompute_progress",
 ]
@@ -1,42 +1,35 @@
+import asyncio
+import json
 import os
-from fastapi import APIRouter, HTTPException
-from starlette import status
-
-from DTO.Assistant import AssistantRequestDTO, AssistantResponseDTO
-
-# Lazy import OpenAI to avoid issues if not installed
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
-
-router = APIRouter(prefix="/assistant")
-
-# Lazy initialization of OpenAI client
-_openai_client = None
+import time
+from typing import AsyncIterator
 
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette import status
 
-def get_openai_client():
-    """Get or initialize OpenAI client"""
-    global _openai_client
+from DTO.Assistant import AssistantRequestDTO, AssistantProblemRequestDTO, AssistantResponseDTO
+from assistant.context import passage_window
+from assistant.hints import hint_cache, hint_fingerprint
+from assistant.local import local_hint
+from assistant.llm import complete, get_openai_client, stream, upstream_stats
+from assistant.prompts import COMPLETION_PARAMS, EMPTY_SUGGESTION, build_messages, fallback_message
+from auth.auth import Principal, require_admin
+from router.EvidenceProblem import catalog as evidence_catalog
+from router.FlashlightProblem import catalog as flashlight_catalog
+from utils.request_metrics import TimedRoute
 
-    if _openai_client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="OpenAI API key not configured"
-            )
+router = APIRouter(prefix="/assistant", route_class=TimedRoute)
 
-        if OpenAI is None:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="OpenAI library not installed"
-            )
+# Problems are looked up in the catalog snapshots, so a hint by id costs no query once they are warm
+_catalogs = {'evidence': evidence_catalog, 'flashlight': flashlight_catalog}
 
-        _openai_client = OpenAI(api_key=api_key)
+# Default latency budget of /suggest in milliseconds for requests that do not set one; unset waits for the model
+ASSISTANT_LATENCY_BUDGET_MS = int(os.environ["ASSISTANT_LATENCY_BUDGET_MS"]) \
+    if os.getenv("ASSISTANT_LATENCY_BUDGET_MS") else None
 
-    return _openai_client
+# Upstream calls raced against a latency budget, referenced until they finish
+_background: set[asyncio.Task] = set()
 
 
 def get_emotion_for_situation(situation: str) -> str:
@@ -49,118 +42,193 @@ def get_emotion_for_situation(situation: str) -> str:
     return emotion_map.get(situation, 'idle')
 
 
-@router.post("/suggest", response_model=AssistantResponseDTO)
-async def get_suggestion(request: AssistantRequestDTO):
-    """
-    Get AI-powered suggestion for student based on their situation.
-
-    Uses OpenAI GPT-4o-mini to generate contextual hints.
-    """
-    # System prompt
-    system_prompt = """You are a helpful IELTS reading practice assistant. Your role is to provide brief, encouraging guidance to students when they make mistakes.
-
-Guidelines:
-- Keep responses under 40 words
-- Be encouraging and supportive, never discouraging
-- Provide specific, actionable hints based on what they selected
-- Point out what to look for without giving the answer
-- Reference specific keywords or concepts from the text
-- Help them develop critical thinking skills"""
+async def _resolve_problem_request(request: AssistantProblemRequestDTO) -> AssistantRequestDTO:
+    """The full request for a stored problem, with the passage cut down to the sentences that matter"""
+    snapshot = await _catalogs[request.problemType].snapshot()
+    if request.problemId not in snapshot.entries:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Problem not found",
+        )
+    problem = await _catalogs[request.problemType].problem(snapshot, request.problemId)
+    if request.problemType == 'evidence':
+        evidence, options, correct_option = problem['evidence'], problem['options'], problem['correct_option']
+    else:
+        # a flashlight problem has no options, its target is the evidence
+        evidence, options, correct_option = problem['target'], [], 0
+    if request.situation == 'wrong_answer' and (request.userAnswer is None
+                                                 or not 0 <= request.userAnswer < len(options)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="userAnswer must be one of the problem's options",
+        )
+    # only the wrong_evidence prompt reads the selection; the other situations window on the evidence alone,
+    # as the precomputed hints are, so a student's selection does not change their fingerprint
+    anchors = [evidence, request.userSelectedText] if request.situation == 'wrong_evidence' else [evidence]
+    return AssistantRequestDTO(
+        problemStatement=problem['problem_statement'],
+        readingContent=passage_window(problem['reading_content'], anchors, problem['problem_statement']),
+        correctEvidence=evidence,
+        userSelectedText=request.userSelectedText,
+        userAnswer=request.userAnswer,
+        correctAnswer=correct_option,
+        options=options,
+        situation=request.situation,
+        latencyBudgetMs=request.latencyBudgetMs,
+    )
+
+
+def _fallback(request: AssistantRequestDTO) -> tuple[str, str]:
+    """The local hint, or the canned message when the local engine has nothing specific to say, and its source"""
+    suggestion = local_hint(request)
+    if suggestion is not None:
+        return suggestion, 'local'
+    return fallback_message(request.situation), 'fallback'
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"OpenAI API error: {str(task.exception())}")
+
+
+async def _suggest(request: AssistantRequestDTO) -> AssistantResponseDTO:
+    emotion = get_emotion_for_situation(request.situation)
+    budget_ms = request.latencyBudgetMs if request.latencyBudgetMs is not None else ASSISTANT_LATENCY_BUDGET_MS
+    try:
+        # Identical mistakes share one hint; only a miss makes the async call through the shared
+        # connection pool, bounded and guarded by the circuit breaker
+        lookup = hint_cache.get_or_compute(
+            hint_fingerprint(request),
+            request.situation,
+            lambda: complete(build_messages(request), **COMPLETION_PARAMS),
+        )
+        if budget_ms is None:
+            suggestion, cached = await lookup
+        else:
+            # past the budget the call goes on and caches its hint for the next student who makes this mistake
+            task = asyncio.ensure_future(lookup)
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+            done, _ = await asyncio.wait({task}, timeout=max(budget_ms, 0) / 1000)
+            if not done:
+                task.add_done_callback(_log_failure)
+                suggestion, source = _fallback(request)
+                return AssistantResponseDTO(suggestion=suggestion, emotion=emotion, source=source)
+            suggestion, cached = task.result()
 
-    # Build user prompt based on situation
-    user_prompt = ""
+        return AssistantResponseDTO(
+            suggestion=suggestion or EMPTY_SUGGESTION,
+            emotion=emotion,
+            source='cache' if cached else 'llm',
+        )
 
-    if request.situation == 'wrong_evidence':
-        user_prompt = f"""The student is trying to answer: "{request.problemStatement}"
+    except HTTPException:
+        # Re-raise HTTP exceptions (API key not configured, etc.)
+        raise
 
-They highlighted this text: "{request.userSelectedText}"
+    except Exception as e:
+        # Log error and return fallback
+        print(f"OpenAI API error: {str(e)}")
 
-But this is incorrect. The correct evidence is somewhere else in this passage:
-\"\"\"
-{request.readingContent}
-\"\"\"
+        suggestion, source = _fallback(request)
+        return AssistantResponseDTO(suggestion=suggestion, emotion=emotion, source=source)
 
-The correct evidence contains: "{request.correctEvidence}"
 
-Help them understand:
-1. Why their selection doesn't answer the question
-2. What keywords from the question they should look for
-3. What part of the passage might contain the answer
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
 
-Keep it brief but specific to their mistake."""
 
-    elif request.situation == 'wrong_answer':
-        user_prompt = f"""The student selected: "{request.options[request.userAnswer]}"
+async def _suggestion_events(request: AssistantRequestDTO, fingerprint: str,
+                             cached: str | None) -> AsyncIterator[bytes]:
+    yield _sse("emotion", {"emotion": get_emotion_for_situation(request.situation)})
+    if cached is not None:
+        yield _sse("token", {"text": cached})
+        yield _sse("done", {})
+        return
 
-But the correct answer is: "{request.options[request.correctAnswer]}"
+    parts = []
+    started = time.monotonic()
+    try:
+        async for text in stream(build_messages(request), **COMPLETION_PARAMS):
+            parts.append(text)
+            yield _sse("token", {"text": text})
+    except Exception as e:
+        print(f"OpenAI API error: {str(e)}")
+        suggestion, source = _fallback(request)
+        yield _sse("fallback", {"suggestion": suggestion, "source": source})
+        yield _sse("done", {})
+        return
+
+    hint_cache.record_upstream(time.monotonic() - started)
+    suggestion = "".join(parts)
+    if suggestion:
+        await hint_cache.put(fingerprint, request.situation, suggestion)
+    else:
+        yield _sse("fallback", {"suggestion": EMPTY_SUGGESTION, "source": "fallback"})
+    yield _sse("done", {})
+
+
+async def _stream(request: AssistantRequestDTO) -> StreamingResponse:
+    fingerprint = hint_fingerprint(request)
+    cached = await hint_cache.lookup(fingerprint)
+    if cached is None:
+        # a missing API key is a 503 as on /suggest, not a fallback inside a 200 stream
+        get_openai_client()
+    return StreamingResponse(
+        _suggestion_events(request, fingerprint, cached),
+        media_type="text/event-stream",
+        # keep proxies from buffering the stream or caching it
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-Here's the evidence they found: "{request.correctEvidence}"
 
-The full reading passage:
-\"\"\"
-{request.readingContent}
-\"\"\"
+@router.post("/suggest", response_model=AssistantResponseDTO)
+async def get_suggestion(request: AssistantRequestDTO):
+    """
+    Get AI-powered suggestion for student based on their situation.
 
-Help them understand:
-1. Why their selected answer doesn't match the evidence
-2. What the evidence actually says
-3. How to better interpret the evidence
+    Uses OpenAI GPT-4o-mini to generate contextual hints. With a latency budget the model races the deadline:
+    past it the answer is a hint from the local engine, while the model's hint is still cached for next time.
+    `source` tells which one answered.
+    """
+    return await _suggest(request)
 
-Be specific about the mismatch between what they chose and what the evidence says."""
 
-    elif request.situation == 'stuck':
-        user_prompt = f"""The student seems stuck on: "{request.problemStatement}"
+@router.post("/suggest/stream")
+async def stream_suggestion(request: AssistantRequestDTO):
+    """
+    Same as /suggest, streamed as Server-Sent Events so the mascot can react before the hint is complete.
 
-Reading passage:
-\"\"\"
-{request.readingContent}
-\"\"\"
+    Events, in order: one `emotion` ({"emotion"}), then `token` events ({"text"}) to append, then `done`.
+    If the upstream fails, even after some tokens, a single `fallback` event ({"suggestion", "source"}) replaces
+    whatever was shown before `done`. A cached hint arrives as a single `token` event. latencyBudgetMs is ignored.
+    """
+    return await _stream(request)
 
-Give them a gentle hint:
-1. What keywords to look for
-2. What section of the passage might help
-3. What strategy to use (scanning, careful reading, etc.)
 
-Keep it encouraging and actionable."""
+@router.post("/suggest/problem", response_model=AssistantResponseDTO)
+async def get_problem_suggestion(request: AssistantProblemRequestDTO):
+    """
+    Same as /suggest for a stored problem, sent by id instead of uploading its passage.
 
-    # Fallback messages if OpenAI fails
-    fallback_messages = {
-        'wrong_evidence': "That selection doesn't seem to answer the question. Look for specific keywords from the question in the passage.",
-        'wrong_answer': "Not quite right. Compare your answer carefully with what the evidence actually says.",
-        'stuck': "Take your time. Try scanning for keywords from the question, then read that section carefully."
-    }
+    The prompt only carries ASSISTANT_CONTEXT_SENTENCES sentences around the evidence and the selection.
+    """
+    return await _suggest(await _resolve_problem_request(request))
 
-    try:
-        # Get OpenAI client
-        client = get_openai_client()
-
-        # Call OpenAI API (synchronous call)
-        completion = client.chat.completions.create(
-            model='gpt-4o-mini',
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=150,
-        )
 
-        suggestion = completion.choices[0].message.content or 'Keep trying! You can do this!'
+@router.post("/suggest/problem/stream")
+async def stream_problem_suggestion(request: AssistantProblemRequestDTO):
+    """Same as /suggest/problem, streamed like /suggest/stream."""
+    return await _stream(await _resolve_problem_request(request))
 
-        return AssistantResponseDTO(
-            suggestion=suggestion,
-            emotion=get_emotion_for_situation(request.situation)
-        )
 
-    except HTTPException:
-        # Re-raise HTTP exceptions (API key not configured, etc.)
-        raise
+@router.get("/upstream_stats")
+async def get_upstream_stats(admin: Principal = Depends(require_admin)):
+    """Circuit breaker state and concurrency of the upstream LLM calls (admin only)."""
+    return upstream_stats()
 
-    except Exception as e:
-        # Log error and return fallback
-        print(f"OpenAI API error: {str(e)}")
 
-        return AssistantResponseDTO(
-            suggestion=fallback_messages.get(request.situation, "Keep going! You're doing great!"),
-            emotion=get_emotion_for_situation(request.situation)
-        )
+@router.get("/hint_cache_stats")
+async def get_hint_cache_stats(admin: Principal = Depends(require_admin)):
+    """Hit, miss and coalescing counters of the hint cache (admin only)."""
+    return hint_cache.stats()
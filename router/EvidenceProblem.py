@@ -1,103 +1,242 @@
+import os
 from typing import List, Optional
 
-from fastapi import Depends, APIRouter, HTTPException
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from fastapi import Depends, APIRouter, HTTPException, BackgroundTasks, Request, Response, Query
+from sqlalchemy import select, or_, and_, exists, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from DTO.EvidenceProblem import EvidenceProblemDTO, EvidenceProblemResponseDTO
-from auth.auth import require_admin, get_current_user
-from model.Base import get_db
+from DTO.EvidenceProblem import EvidenceProblemDTO, EvidenceProblemResponseDTO, EvidenceGradeDTO, \
+    EvidenceGradeResponseDTO
+from DTO.SolvedStatus import SolvedStatusResponseDTO
+from assistant.precompute import ASSISTANT_PRECOMPUTE_HINTS, ProblemHintSource, precompute_in_background
+from bulk.importer import IMPORT_BATCH_SIZE, import_stream
+from auth.auth import Principal, require_admin, get_current_user, get_optional_user, optional_oauth2_scheme
+from model.Base import get_async_db, get_async_read_db
+from model.Base import user_evidence_problem_association as solved_association
+from model.Catalog import Catalog
 from model.EvidenceProblem import EvidenceProblemDB
-from model.User import UserDB
+from model.Progress import EVIDENCE_CATALOG, track_status_query
+from model.ReadingContent import ReadingContentDB
+from model.Search import evidence_problem_fts, fts_match, to_fts_query
+from utils.bitmap import encode_id_bitmap
+from utils.cache import TTLCache
+from utils.text_index import token_offsets, token_range
+from utils.conditional import validator_headers, is_not_modified, not_modified
+from utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from utils.request_metrics import TimedRoute
+
+router = APIRouter(prefix="/evidence_problem", route_class=TimedRoute)
+
+# Anonymous catalog reads are served from this snapshot, the admin write routes invalidate it
+catalog = Catalog(EvidenceProblemDB, EvidenceProblemResponseDTO)
+
+
+MAX_SOLVED_STATUS_IDS = 1000
+MAX_SOLVED_STATUS_RANGE = 8000
+
+# Token offsets of the passages highlights are graded on, by reading_content_id. A passage never changes,
+# so its entry only leaves to make room.
+GRADE_PASSAGE_CACHE_SIZE = int(os.getenv("GRADE_PASSAGE_CACHE_SIZE", 1024))
+_token_indexes = TTLCache(maxsize=GRADE_PASSAGE_CACHE_SIZE, ttl=float("inf"))
+
+
+def _grade_highlight(problem_id: int, evidence_tokens: list[int] | None, offsets: dict | None,
+                     start: int, end: int) -> EvidenceGradeResponseDTO:
+    """Compare the tokens a highlight touches with the evidence's tokens, two bisections on the passage offsets"""
+    if evidence_tokens is None:
+        # the evidence does not occur in the passage, nothing can match it
+        return EvidenceGradeResponseDTO(problem_id=problem_id, verdict='miss', score=0.0, precision=0.0, recall=0.0)
+    first, last = token_range(offsets, start, end)
+    evidence_first, evidence_last = evidence_tokens
+    overlap = max(min(last, evidence_last) - max(first, evidence_first), 0)
+    precision = overlap / (last - first) if last > first else 0.0
+    recall = overlap / (evidence_last - evidence_first)
+    if (first, last) == (evidence_first, evidence_last):
+        verdict = 'exact'
+    elif overlap:
+        verdict = 'overlap'
+    else:
+        verdict = 'miss'
+    return EvidenceGradeResponseDTO(
+        problem_id=problem_id,
+        verdict=verdict,
+        score=2 * precision * recall / (precision + recall) if overlap else 0.0,
+        precision=precision,
+        recall=recall,
+        evidence_span=[offsets["starts"][evidence_first], offsets["ends"][evidence_last - 1]],
+    )
+
+
+async def _passage_token_index(db: AsyncSession, passage_id: int) -> dict:
+    offsets = _token_indexes.get(passage_id)
+    if offsets is None:
+        offsets = await db.scalar(select(ReadingContentDB.token_index).where(ReadingContentDB.id == passage_id))
+        if offsets is None:
+            # stored before passages had offsets and script.build_answer_index has not run yet
+            content = await db.scalar(select(ReadingContentDB.content).where(ReadingContentDB.id == passage_id))
+            offsets = token_offsets(content)
+        _token_indexes.set(passage_id, offsets)
+    return offsets
 
-router = APIRouter(prefix="/evidence_problem")
+
+async def _load_solved_ids(db: AsyncSession, user_id: int, id_filter) -> list[int]:
+    result = await db.execute(
+        select(solved_association.c.evidence_problem_id)
+        .where(solved_association.c.user_id == user_id, id_filter)
+        .order_by(solved_association.c.evidence_problem_id)
+    )
+    return list(result.scalars().all())
+
+
+async def _solved_among(db: AsyncSession, user_id: int, problem_ids) -> set[int]:
+    """The caller's solved flags for a page of problems, one query for the whole page"""
+    return set(await _load_solved_ids(db, user_id, solved_association.c.evidence_problem_id.in_(problem_ids)))
+
+
+async def _ensure_problem_exists(db: AsyncSession, problem_id: int) -> None:
+    if not await db.scalar(select(exists().where(EvidenceProblemDB.id == problem_id))):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Problem not found",
+        )
 
 
 @router.post("/create", response_model=EvidenceProblemResponseDTO)
 async def create_reading_content(input_data: EvidenceProblemDTO,
-                                 admin: UserDB = Depends(require_admin),
-                                 db: Session = Depends(get_db)):
+                                 background_tasks: BackgroundTasks,
+                                 admin: Principal = Depends(require_admin),
+                                 db: AsyncSession = Depends(get_async_db)):
     new_problem = EvidenceProblemDB()
     new_problem.reading_content = input_data.reading_content
     new_problem.evidence = input_data.evidence
     new_problem.problem_statement = input_data.problem_statement
-    new_problem.correct_answer = input_data.correct_answer
+    new_problem.correct_option = input_data.correct_option
     new_problem.options = input_data.options
     db.add(new_problem)
-    db.commit()
-    db.refresh(new_problem)
+    await db.commit()
+    catalog.invalidate()
+    await db.refresh(new_problem)
+    if ASSISTANT_PRECOMPUTE_HINTS:
+        background_tasks.add_task(precompute_in_background, ProblemHintSource.of(new_problem))
     return new_problem
 
 
+@router.post("/import")
+async def import_evidence_problems(request: Request,
+                                   batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000),
+                                   admin: Principal = Depends(require_admin)):
+    """
+    Bulk import evidence problems from an NDJSON body, one EvidenceProblemDTO object per line (admin only).
+
+    The body is read as a stream and inserted in transactions of batch_size rows. Invalid rows and
+    duplicates (same statement on the same passage) are skipped and counted in the returned report.
+    """
+    try:
+        report = await import_stream("evidence", request.stream(), batch_size)
+    finally:
+        # batches committed before a failure are visible too
+        catalog.invalidate()
+    return report.as_dict()
+
+
 @router.post("/delete")
 async def delete_evidence_problem(problem_id: int,
-                                  admin: UserDB = Depends(require_admin),
-                                  db: Session = Depends(get_db)):
-    problem: EvidenceProblemDB | None = db.query(EvidenceProblemDB).filter(EvidenceProblemDB.id == problem_id).first()
+                                  admin: Principal = Depends(require_admin),
+                                  db: AsyncSession = Depends(get_async_db)):
+    problem: EvidenceProblemDB | None = await db.get(EvidenceProblemDB, problem_id)
     if not problem:
         raise HTTPException(status_code=400, detail="Problem already deleted")
-    db.delete(problem)
-    db.commit()
+    await db.delete(problem)
+    await db.commit()
+    catalog.invalidate()
     return {"ok": True, "id": problem.id}
 
 
 @router.post("/update", response_model=EvidenceProblemResponseDTO)
 async def update_evidence_problem(input_data: EvidenceProblemDTO,
                                   problem_id: int,
-                                  admin: UserDB = Depends(require_admin),
-                                  db: Session = Depends(get_db)):
-    problem: EvidenceProblemDB | None = db.query(EvidenceProblemDB).filter(
-        EvidenceProblemDB.id == problem_id).first()
+                                  background_tasks: BackgroundTasks,
+                                  admin: Principal = Depends(require_admin),
+                                  db: AsyncSession = Depends(get_async_db)):
+    problem: EvidenceProblemDB | None = await db.get(EvidenceProblemDB, problem_id)
     if not problem:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Problems not found")
     problem.reading_content = input_data.reading_content
     problem.evidence = input_data.evidence
     problem.problem_statement = input_data.problem_statement
     problem.options = input_data.options
-    problem.correct_answer = input_data.correct_answer
-    db.commit()
-    db.refresh(problem)
+    problem.correct_option = input_data.correct_option
+    await db.commit()
+    catalog.invalidate()
+    await db.refresh(problem)
+    if ASSISTANT_PRECOMPUTE_HINTS:
+        background_tasks.add_task(precompute_in_background, ProblemHintSource.of(problem))
     return problem
 
 
 @router.get("/search",
             response_model=List[EvidenceProblemResponseDTO],
+            response_model_exclude_none=True,
             status_code=status.HTTP_200_OK)
 async def search_evidence_problems(
         q: Optional[str] = None,
         problem_id: Optional[int] = None,
         limit: int = 50,
         offset: int = 0,
-        db: Session = Depends(get_db),
+        cursor: Optional[str] = None,
+        with_solved: bool = False,
+        include_passage: bool = True,
+        token: str | None = Depends(optional_oauth2_scheme),
+        db: AsyncSession = Depends(get_async_read_db),
 ):
-    query = db.query(EvidenceProblemDB)
-
-    if problem_id is not None:
-        query = query.filter(EvidenceProblemDB.id == problem_id)
+    limit = min(limit, 200)
+    snapshot = await catalog.snapshot()
+    headers = {}
 
     if q:
-        pattern = f"%{q}%"
-        query = query.filter(
-            or_(
-                EvidenceProblemDB.reading_content.ilike(pattern),
-                EvidenceProblemDB.evidence.ilike(pattern),
-                EvidenceProblemDB.problem_statement.ilike(pattern),
-            )
-        )
-
-    return (
-        query.order_by(EvidenceProblemDB.id.desc())
-        .offset(offset)
-        .limit(min(limit, 200))
-        .all()
-    )
+        match = to_fts_query(q)
+        if match is None:
+            return []
+        # Full-text lookup through the FTS5 index, best bm25 rank first; the problems come from the snapshot
+        problem_ids = evidence_problem_fts.c.rowid
+        rank = evidence_problem_fts.c.rank
+        query = select(problem_ids, rank).where(fts_match(evidence_problem_fts, match))
+        if problem_id is not None:
+            query = query.where(problem_ids == problem_id)
+        if cursor is not None:
+            last_rank, last_id = decode_cursor(cursor, "rank", "id")
+            query = query.where(or_(rank > last_rank, and_(rank == last_rank, problem_ids < last_id)))
+        query = query.order_by(rank, problem_ids.desc()).limit(limit)
+        if cursor is None:
+            query = query.offset(offset)
+        rows = (await db.execute(query)).all()
+        if rows and len(rows) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(rank=rows[-1].rank, id=rows[-1].rowid)
+        ids = [row.rowid for row in rows if row.rowid in snapshot.entries]
+    else:
+        if problem_id is not None:
+            ids = (problem_id,) if problem_id in snapshot.entries and cursor is None and offset == 0 else ()
+        elif cursor is not None:
+            last_id, = decode_cursor(cursor, "id")
+            ids = snapshot.descending(limit, before_id=last_id)
+        else:
+            ids = snapshot.descending(limit, offset=offset)
+        if ids and len(ids) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(id=ids[-1])
+
+    # the caller is only looked up for the solved flags
+    user = await get_optional_user(token, db) if with_solved else None
+    solved_ids = await _solved_among(db, user.id, ids) if user is not None else None
+    body = await catalog.list_json(snapshot, ids, include_passage, solved_ids)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.post("/solved_by_user")
 async def solved_by_user(question_id: int,
-                         user: UserDB = Depends(get_current_user),
-                         db: Session = Depends(get_db),
+                         user: Principal = Depends(get_current_user),
+                         db: AsyncSession = Depends(get_async_db),
                          ):
     """
     Mark a question as solved by the user
@@ -107,38 +246,51 @@ async def solved_by_user(question_id: int,
     :return:
     """
     print(f"User {user.username} is solving question {question_id}")
-    problem: EvidenceProblemDB | None = (
-        db.query(EvidenceProblemDB)
-        .filter(EvidenceProblemDB.id == question_id)
-        .first()
-    )
-    if problem is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Problem not found",
-        )
-
-    # Update both sides of the relationship
-    if problem not in user.evidence_problems_solved:
-        user.evidence_problems_solved.append(problem)
-    if user not in problem.solved_by_users:
-        problem.solved_by_users.append(user)
+    await _ensure_problem_exists(db, question_id)
 
-    db.add(user)
-    db.add(problem)
-    db.commit()
+    # The composite primary key makes a repeated solve a no-op
+    await db.execute(
+        sqlite_insert(solved_association)
+        .values(user_id=user.id, evidence_problem_id=question_id)
+        .on_conflict_do_nothing()
+    )
+    await db.commit()
 
     return {
         "solved": True,
         "user_id": user.id,
-        "problem_id": problem.id,
+        "problem_id": question_id,
     }
 
 
+@router.post("/grade", response_model=EvidenceGradeResponseDTO)
+async def grade_evidence_highlight(input_data: EvidenceGradeDTO,
+                                   db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Grade a highlighted span against the problem's evidence using the token range stored with the problem
+    and the token offsets stored once with its passage.
+
+    Words are compared, not characters, so whitespace and punctuation at the edges of a highlight do not matter.
+    """
+    row = (await db.execute(
+        select(EvidenceProblemDB.evidence_tokens, EvidenceProblemDB.reading_content_id)
+        .where(EvidenceProblemDB.id == input_data.problem_id)
+    )).one_or_none()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Problem not found",
+        )
+    offsets = None
+    if row.evidence_tokens is not None:
+        offsets = await _passage_token_index(db, row.reading_content_id)
+    return _grade_highlight(input_data.problem_id, row.evidence_tokens, offsets, input_data.start, input_data.end)
+
+
 @router.post("/reset_by_user")
 async def reset_by_user(question_id: int,
-                        user: UserDB = Depends(get_current_user),
-                        db: Session = Depends(get_db),
+                        user: Principal = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_async_db),
                         ):
     """
     Reset a question as to be unsolved by the user
@@ -148,94 +300,153 @@ async def reset_by_user(question_id: int,
     :return:
     """
     print(f"User {user.username} is solving question {question_id}")
-    problem: EvidenceProblemDB | None = (
-        db.query(EvidenceProblemDB)
-        .filter(EvidenceProblemDB.id == question_id)
-        .first()
-    )
-    if problem is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Problem not found",
-        )
-
-        # Remove the relationship if it exists
-    if problem in user.evidence_problems_solved:
-        user.evidence_problems_solved.remove(problem)
+    await _ensure_problem_exists(db, question_id)
 
-    if user in problem.solved_by_users:
-        problem.solved_by_users.remove(user)
-
-    db.add(user)
-    db.add(problem)
-    db.commit()
+    # Remove the relationship if it exists
+    await db.execute(
+        delete(solved_association)
+        .where(solved_association.c.user_id == user.id,
+               solved_association.c.evidence_problem_id == question_id)
+    )
+    await db.commit()
 
     return {
         "solved": False,
         "user_id": user.id,
-        "problem_id": problem.id,
+        "problem_id": question_id,
     }
 
 
 @router.get(
     "/all",
     response_model=List[EvidenceProblemResponseDTO],
+    response_model_exclude_none=True,
     status_code=status.HTTP_200_OK,
 )
 async def get_all_problem_with_pagination(
+        request: Request,
         page: int = 0,
         page_size: int = 50,
-        db: Session = Depends(get_db),
+        cursor: Optional[str] = None,
+        with_solved: bool = False,
+        include_passage: bool = True,
+        token: str | None = Depends(optional_oauth2_scheme),
+        db: AsyncSession = Depends(get_async_read_db),
 ):
     if page < 0:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid page")
     limit = min(page_size, 200)
-    offset = page * limit
-    return (
-        db.query(EvidenceProblemDB)
-        .order_by(EvidenceProblemDB.id.asc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
+    snapshot = await catalog.snapshot()
+    if cursor is not None:
+        last_id, = decode_cursor(cursor, "id")
+        ids = snapshot.ascending(limit, after_id=last_id)
+    else:
+        ids = snapshot.ascending(limit, offset=page * limit)
+
+    headers = {}
+    if ids and len(ids) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(id=ids[-1])
+    # solved flags are per caller and change on every solve, so only the plain catalog page is validated
+    user = await get_optional_user(token, db) if with_solved else None
+    if user is not None:
+        solved_ids = await _solved_among(db, user.id, ids)
+    else:
+        solved_ids = None
+        etag, last_modified = snapshot.page_validators(ids)
+        headers.update(validator_headers(etag, last_modified))
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(headers)
+    body = await catalog.list_json(snapshot, ids, include_passage, solved_ids)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/get/{problem_id}", response_model=EvidenceProblemResponseDTO)
 async def get_problem_by_id(problem_id: int,
-                            db: Session = Depends(get_db)):
-    problem: EvidenceProblemDB | None = db.query(EvidenceProblemDB).filter(
-        EvidenceProblemDB.id == problem_id).first()
-    if not problem:
+                            request: Request):
+    snapshot = await catalog.snapshot()
+    if problem_id not in snapshot.entries:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Problem not found")
-    return problem
+    etag, last_modified = snapshot.validators(problem_id)
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+    body = await catalog.problem_json(snapshot, problem_id, exclude_none=False)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/is_solved_by_user")
 async def get_my_solved_problems(problem_id: int,
-                                 user: UserDB = Depends(get_current_user),
-                                 db: Session = Depends(get_db)
+                                 user: Principal = Depends(get_current_user),
+                                 db: AsyncSession = Depends(get_async_read_db)
                                  ):
-    for problem in user.evidence_problems_solved:
-        if problem.id == problem_id:
-            return {"solved": True}
-    return {"solved": False}
+    is_solved = await db.scalar(
+        select(exists().where(solved_association.c.user_id == user.id,
+                            solved_association.c.evidence_problem_id == problem_id))
+    )
+    return {"solved": is_solved}
+
+
+@router.get("/solved_status", response_model=SolvedStatusResponseDTO, response_model_exclude_none=True)
+async def get_solved_status(
+        ids: Optional[List[int]] = Query(None),
+        start_id: Optional[int] = None,
+        end_id: Optional[int] = None,
+        bitmap: bool = False,
+        user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Solved status of many evidence problems in one call, for a list of ids or for the range [start_id, end_id].
+
+    - **ids**: Problem ids to check (max 1000), returned as solved_ids
+    - **start_id** / **end_id**: Inclusive id range (at most 8000 ids) to check instead of ids
+    - **bitmap**: Answer a range as a base64 bitmap rather than a list of ids
+    """
+    column = solved_association.c.evidence_problem_id
+    if ids:
+        if len(ids) > MAX_SOLVED_STATUS_IDS or bitmap:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Pass at most {MAX_SOLVED_STATUS_IDS} ids, bitmaps need start_id and end_id"
+            )
+        return SolvedStatusResponseDTO(solved_ids=await _load_solved_ids(db, user.id, column.in_(ids)))
+
+    if start_id is None or end_id is None or not 0 <= end_id - start_id < MAX_SOLVED_STATUS_RANGE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Pass ids, or start_id and end_id spanning at most {MAX_SOLVED_STATUS_RANGE} problems"
+        )
+    solved_ids = await _load_solved_ids(db, user.id, column.between(start_id, end_id))
+    if bitmap:
+        return SolvedStatusResponseDTO(
+            start_id=start_id,
+            end_id=end_id,
+            bitmap=encode_id_bitmap(start_id, end_id, solved_ids),
+        )
+    return SolvedStatusResponseDTO(solved_ids=solved_ids)
 
 
 @router.get("/get_all_problems_solved_by_user", response_model=List[EvidenceProblemResponseDTO])
 async def get_all_solved_problems_by_user(
-        user: UserDB = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_read_db)
 ):
-    return user.evidence_problems_solved
+    result = await db.execute(
+        select(EvidenceProblemDB)
+        .join(solved_association, solved_association.c.evidence_problem_id == EvidenceProblemDB.id)
+        .where(solved_association.c.user_id == user.id)
+        .order_by(EvidenceProblemDB.id.asc())
+    )
+    return result.scalars().all()
 
 
 @router.get("/get_user_track_status")
 async def get_user_evidence_track_status(
-        user: UserDB = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_read_db)
 ):
-    total_problems = db.query(EvidenceProblemDB).count()
-    solved_problems = len(user.evidence_problems_solved)
+    # counters are kept by triggers in the same transaction as every solve, reset, create and delete
+    total_problems, solved_problems = (await db.execute(track_status_query(EVIDENCE_CATALOG, user.id))).one()
     return {
         "total_problems": total_problems,
         "solved_problems": solved_problems,
@@ -0,0 +1,29 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from auth.auth import Principal, require_admin
+from bulk.exporter import EXPORT_MEDIA_TYPES, export_stream
+from utils.request_metrics import TimedRoute
+
+router = APIRouter(prefix="/export", route_class=TimedRoute)
+
+
+@router.get("/{name}")
+async def export_table(
+    name: Literal["evidence_problems", "flashlight_problems", "evidence_progress", "flashlight_progress"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    admin: Principal = Depends(require_admin),
+):
+    """
+    Stream a whole problem table or user-problem association table as NDJSON or CSV (admin only).
+
+    Rows are read with a server-side cursor and sent in chunks, so memory stays flat however large the table.
+    The problem exports import back through the /import routes.
+    """
+    return StreamingResponse(
+        export_stream(name, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
+    )
@@ -1,24 +1,84 @@
+import os
+from bisect import bisect_left
 from typing import List, Optional
 
-from fastapi import Depends, APIRouter, HTTPException
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from fastapi import Depends, APIRouter, HTTPException, Request, Response, Query
+from sqlalchemy import select, or_, and_, exists, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from DTO.FlashlightProblem import FlashlightProblemDTO, FlashlightProblemResponseDTO
-from auth.auth import require_admin, get_current_user
-from model.Base import get_db
+from DTO.FlashlightProblem import FlashlightProblemDTO, FlashlightProblemResponseDTO, FlashlightGradeDTO, \
+    FlashlightGradeResponseDTO
+from DTO.SolvedStatus import SolvedStatusResponseDTO
+from bulk.importer import IMPORT_BATCH_SIZE, import_stream
+from auth.auth import Principal, require_admin, get_current_user, get_optional_user, optional_oauth2_scheme
+from model.Base import get_async_db, get_async_read_db, async_session_scope
+from model.Base import user_flashlight_problem_association as solved_association
+from model.Catalog import Catalog
 from model.FlashlightProblem import FlashlightProblemDB
-from model.User import UserDB
+from model.Progress import FLASHLIGHT_CATALOG, track_status_query
+from model.Search import flashlight_problem_fts, fts_match, to_fts_query
+from utils.bitmap import encode_id_bitmap
+from utils.conditional import validator_headers, is_not_modified, not_modified
+from utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from utils.request_metrics import TimedRoute
 
-router = APIRouter(prefix="/flashlight_problem")
+router = APIRouter(prefix="/flashlight_problem", route_class=TimedRoute)
+
+# Anonymous catalog reads are served from this snapshot, the admin write routes invalidate it
+catalog = Catalog(FlashlightProblemDB, FlashlightProblemResponseDTO)
+
+
+MAX_SOLVED_STATUS_IDS = 1000
+MAX_SOLVED_STATUS_RANGE = 8000
+
+FLASHLIGHT_TIME_LIMIT_MS = int(os.getenv("FLASHLIGHT_TIME_LIMIT_MS", 15000))
+# Characters a highlight may spill over an occurrence of the target on each side, e.g. a space or a comma
+FLASHLIGHT_SPAN_SLACK = int(os.getenv("FLASHLIGHT_SPAN_SLACK", 2))
+
+
+def _match_span(spans: list[list[int]], start: int, end: int) -> list[int] | None:
+    """
+    The occurrence of the target the highlight [start, end) covers, allowing FLASHLIGHT_SPAN_SLACK each side.
+    The spans are sorted and do not overlap, so only those starting within the slack after start can match.
+    """
+    index = bisect_left(spans, start, key=lambda span: span[0])
+    while index < len(spans) and spans[index][0] <= start + FLASHLIGHT_SPAN_SLACK:
+        span = spans[index]
+        if span[1] <= end <= span[1] + FLASHLIGHT_SPAN_SLACK:
+            return span
+        index += 1
+    return None
+
+
+async def _load_solved_ids(db: AsyncSession, user_id: int, id_filter) -> list[int]:
+    result = await db.execute(
+        select(solved_association.c.flashlight_problem_id)
+        .where(solved_association.c.user_id == user_id, id_filter)
+        .order_by(solved_association.c.flashlight_problem_id)
+    )
+    return list(result.scalars().all())
+
+
+async def _solved_among(db: AsyncSession, user_id: int, problem_ids) -> set[int]:
+    """The caller's solved flags for a page of problems, one query for the whole page"""
+    return set(await _load_solved_ids(db, user_id, solved_association.c.flashlight_problem_id.in_(problem_ids)))
+
+
+async def _ensure_problem_exists(db: AsyncSession, problem_id: int) -> None:
+    if not await db.scalar(select(exists().where(FlashlightProblemDB.id == problem_id))):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Problem not found",
+        )
 
 
 @router.post("/create", response_model=FlashlightProblemResponseDTO)
 async def create_flashlight_problem(
     input_data: FlashlightProblemDTO,
-    admin: UserDB = Depends(require_admin),
-    db: Session = Depends(get_db)
+    admin: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new flashlight drill problem (admin only).
@@ -32,21 +92,40 @@ async def create_flashlight_problem(
         reading_content=input_data.reading_content
     )
     db.add(new_problem)
-    db.commit()
-    db.refresh(new_problem)
+    await db.commit()
+    catalog.invalidate()
+    await db.refresh(new_problem)
     return new_problem
 
 
+@router.post("/import")
+async def import_flashlight_problems(
+    request: Request,
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000),
+    admin: Principal = Depends(require_admin)
+):
+    """
+    Bulk import flashlight problems from an NDJSON body, one FlashlightProblemDTO object per line (admin only).
+
+    The body is read as a stream and inserted in transactions of batch_size rows. Invalid rows and
+    duplicates (same statement on the same passage) are skipped and counted in the returned report.
+    """
+    try:
+        report = await import_stream("flashlight", request.stream(), batch_size)
+    finally:
+        # batches committed before a failure are visible too
+        catalog.invalidate()
+    return report.as_dict()
+
+
 @router.post("/delete")
 async def delete_flashlight_problem(
     problem_id: int,
-    admin: UserDB = Depends(require_admin),
-    db: Session = Depends(get_db)
+    admin: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a flashlight problem (admin only)."""
-    problem: FlashlightProblemDB | None = db.query(FlashlightProblemDB).filter(
-        FlashlightProblemDB.id == problem_id
-    ).first()
+    problem: FlashlightProblemDB | None = await db.get(FlashlightProblemDB, problem_id)
 
     if not problem:
         raise HTTPException(
@@ -54,8 +133,9 @@ async def delete_flashlight_problem(
             detail="Problem not found or already deleted"
         )
 
-    db.delete(problem)
-    db.commit()
+    await db.delete(problem)
+    await db.commit()
+    catalog.invalidate()
     return {"ok": True, "id": problem.id}
 
 
@@ -63,13 +143,11 @@ async def delete_flashlight_problem(
 async def update_flashlight_problem(
     input_data: FlashlightProblemDTO,
     problem_id: int,
-    admin: UserDB = Depends(require_admin),
-    db: Session = Depends(get_db)
+    admin: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing flashlight problem (admin only)."""
-    problem: FlashlightProblemDB | None = db.query(FlashlightProblemDB).filter(
-        FlashlightProblemDB.id == problem_id
-    ).first()
+    problem: FlashlightProblemDB | None = await db.get(FlashlightProblemDB, problem_id)
 
     if not problem:
         raise HTTPException(
@@ -81,142 +159,200 @@ async def update_flashlight_problem(
     problem.target = input_data.target
     problem.reading_content = input_data.reading_content
 
-    db.commit()
-    db.refresh(problem)
+    await db.commit()
+    catalog.invalidate()
+    await db.refresh(problem)
     return problem
 
 
-@router.get("/search", response_model=List[FlashlightProblemResponseDTO], status_code=status.HTTP_200_OK)
+@router.get("/search", response_model=List[FlashlightProblemResponseDTO], response_model_exclude_none=True,
+            status_code=status.HTTP_200_OK)
 async def search_flashlight_problems(
     q: Optional[str] = None,
     problem_id: Optional[int] = None,
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    with_solved: bool = False,
+    include_passage: bool = True,
+    token: str | None = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Search flashlight problems by query string.
 
-    - **q**: Search in problem_statement, target, or reading_content
+    - **q**: Full-text search over problem_statement, target and reading_content, ranked by bm25
     - **problem_id**: Filter by specific problem ID
     - **limit**: Max results (capped at 200)
     - **offset**: Pagination offset
+    - **cursor**: Keyset cursor from the previous page's X-Next-Cursor header, replaces offset
+    - **with_solved**: Add the authenticated caller's solved flag to every result
+    - **include_passage**: Set false to leave out the passage text, fetch it once per reading_content_id instead
     """
-    query = db.query(FlashlightProblemDB)
-
-    if problem_id is not None:
-        query = query.filter(FlashlightProblemDB.id == problem_id)
+    limit = min(limit, 200)
+    snapshot = await catalog.snapshot()
+    headers = {}
 
     if q:
-        pattern = f"%{q}%"
-        query = query.filter(
-            or_(
-                FlashlightProblemDB.reading_content.ilike(pattern),
-                FlashlightProblemDB.target.ilike(pattern),
-                FlashlightProblemDB.problem_statement.ilike(pattern),
-            )
-        )
-
-    return (
-        query.order_by(FlashlightProblemDB.id.desc())
-        .offset(offset)
-        .limit(min(limit, 200))
-        .all()
-    )
+        match = to_fts_query(q)
+        if match is None:
+            return []
+        # Full-text lookup through the FTS5 index, best bm25 rank first; the problems come from the snapshot
+        problem_ids = flashlight_problem_fts.c.rowid
+        rank = flashlight_problem_fts.c.rank
+        query = select(problem_ids, rank).where(fts_match(flashlight_problem_fts, match))
+        if problem_id is not None:
+            query = query.where(problem_ids == problem_id)
+        if cursor is not None:
+            last_rank, last_id = decode_cursor(cursor, "rank", "id")
+            query = query.where(or_(rank > last_rank, and_(rank == last_rank, problem_ids < last_id)))
+        query = query.order_by(rank, problem_ids.desc()).limit(limit)
+        if cursor is None:
+            query = query.offset(offset)
+        rows = (await db.execute(query)).all()
+        if rows and len(rows) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(rank=rows[-1].rank, id=rows[-1].rowid)
+        ids = [row.rowid for row in rows if row.rowid in snapshot.entries]
+    else:
+        if problem_id is not None:
+            ids = (problem_id,) if problem_id in snapshot.entries and cursor is None and offset == 0 else ()
+        elif cursor is not None:
+            last_id, = decode_cursor(cursor, "id")
+            ids = snapshot.descending(limit, before_id=last_id)
+        else:
+            ids = snapshot.descending(limit, offset=offset)
+        if ids and len(ids) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(id=ids[-1])
+
+    # the caller is only looked up for the solved flags
+    user = await get_optional_user(token, db) if with_solved else None
+    solved_ids = await _solved_among(db, user.id, ids) if user is not None else None
+    body = await catalog.list_json(snapshot, ids, include_passage, solved_ids)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.post("/solved_by_user")
 async def solved_by_user(
     question_id: int,
-    user: UserDB = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Mark a flashlight problem as solved by the current user.
 
     Updates the many-to-many relationship between users and flashlight problems.
     """
-    problem: FlashlightProblemDB | None = (
-        db.query(FlashlightProblemDB)
-        .filter(FlashlightProblemDB.id == question_id)
-        .first()
-    )
-
-    if problem is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Problem not found",
-        )
-
-    # Update both sides of the relationship
-    if problem not in user.flashlight_problems_solved:
-        user.flashlight_problems_solved.append(problem)
-    if user not in problem.solved_by_users:
-        problem.solved_by_users.append(user)
+    await _ensure_problem_exists(db, question_id)
 
-    db.add(user)
-    db.add(problem)
-    db.commit()
+    # The composite primary key makes a repeated solve a no-op
+    await db.execute(
+        sqlite_insert(solved_association)
+        .values(user_id=user.id, flashlight_problem_id=question_id)
+        .on_conflict_do_nothing()
+    )
+    await db.commit()
 
     return {
         "solved": True,
         "user_id": user.id,
-        "problem_id": problem.id,
+        "problem_id": question_id,
     }
 
 
-@router.post("/reset_by_user")
-async def reset_by_user(
-    question_id: int,
-    user: UserDB = Depends(get_current_user),
-    db: Session = Depends(get_db),
+@router.post("/grade", response_model=FlashlightGradeResponseDTO)
+async def grade_flashlight_highlight(
+    input_data: FlashlightGradeDTO,
+    user: Principal | None = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
-    Mark a flashlight problem as unsolved (reset user progress).
+    Grade a highlight against the precomputed occurrences of the target, without reading the passage.
 
-    Removes the relationship between user and problem.
+    A correct highlight within the time limit also marks the problem solved for an authenticated caller.
+    The elapsed time is reported by the client, so the time limit is advisory.
     """
-    problem: FlashlightProblemDB | None = (
-        db.query(FlashlightProblemDB)
-        .filter(FlashlightProblemDB.id == question_id)
-        .first()
+    spans = await db.scalar(
+        select(FlashlightProblemDB.target_spans).where(FlashlightProblemDB.id == input_data.problem_id)
     )
-
-    if problem is None:
+    if spans is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Problem not found",
         )
+    span = _match_span(spans, input_data.start, input_data.end)
+    in_time = 0 <= input_data.elapsed_ms <= FLASHLIGHT_TIME_LIMIT_MS
+    solved = span is not None and in_time
+
+    if solved and user is not None:
+        # grading only reads, the single writer connection is taken for the solve alone
+        async with async_session_scope() as writer:
+            await writer.execute(
+                sqlite_insert(solved_association)
+                .values(user_id=user.id, flashlight_problem_id=input_data.problem_id)
+                .on_conflict_do_nothing()
+            )
+            await writer.commit()
+
+    return FlashlightGradeResponseDTO(
+        problem_id=input_data.problem_id,
+        correct=span is not None,
+        in_time=in_time,
+        solved=solved,
+        time_limit_ms=FLASHLIGHT_TIME_LIMIT_MS,
+        span=span,
+    )
 
-    # Remove the relationship if it exists
-    if problem in user.flashlight_problems_solved:
-        user.flashlight_problems_solved.remove(problem)
 
-    if user in problem.solved_by_users:
-        problem.solved_by_users.remove(user)
+@router.post("/reset_by_user")
+async def reset_by_user(
+    question_id: int,
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Mark a flashlight problem as unsolved (reset user progress).
+
+    Removes the relationship between user and problem.
+    """
+    await _ensure_problem_exists(db, question_id)
 
-    db.add(user)
-    db.add(problem)
-    db.commit()
+    # Remove the relationship if it exists
+    await db.execute(
+        delete(solved_association)
+        .where(solved_association.c.user_id == user.id,
+               solved_association.c.flashlight_problem_id == question_id)
+    )
+    await db.commit()
 
     return {
         "solved": False,
         "user_id": user.id,
-        "problem_id": problem.id,
+        "problem_id": question_id,
     }
 
 
-@router.get("/all", response_model=List[FlashlightProblemResponseDTO], status_code=status.HTTP_200_OK)
+@router.get("/all", response_model=List[FlashlightProblemResponseDTO], response_model_exclude_none=True,
+            status_code=status.HTTP_200_OK)
 async def get_all_problems_with_pagination(
+    request: Request,
     page: int = 0,
     page_size: int = 50,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    with_solved: bool = False,
+    include_passage: bool = True,
+    token: str | None = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Get all flashlight problems with pagination.
 
     - **page**: Page number (0-indexed)
     - **page_size**: Items per page (max 200)
+    - **cursor**: Keyset cursor from the previous page's X-Next-Cursor header, replaces page
+    - **with_solved**: Add the authenticated caller's solved flag to every result
+    - **include_passage**: Set false to leave out the passage text, fetch it once per reading_content_id instead
+
+    Without with_solved the page carries an ETag and Last-Modified and answers 304 to a matching revalidation.
     """
     if page < 0:
         raise HTTPException(
@@ -225,70 +361,135 @@ async def get_all_problems_with_pagination(
         )
 
     limit = min(page_size, 200)
-    offset = page * limit
-
-    return (
-        db.query(FlashlightProblemDB)
-        .order_by(FlashlightProblemDB.id.asc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
+    snapshot = await catalog.snapshot()
+    if cursor is not None:
+        last_id, = decode_cursor(cursor, "id")
+        ids = snapshot.ascending(limit, after_id=last_id)
+    else:
+        ids = snapshot.ascending(limit, offset=page * limit)
+
+    headers = {}
+    if ids and len(ids) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(id=ids[-1])
+    # solved flags are per caller and change on every solve, so only the plain catalog page is validated
+    user = await get_optional_user(token, db) if with_solved else None
+    if user is not None:
+        solved_ids = await _solved_among(db, user.id, ids)
+    else:
+        solved_ids = None
+        etag, last_modified = snapshot.page_validators(ids)
+        headers.update(validator_headers(etag, last_modified))
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(headers)
+    body = await catalog.list_json(snapshot, ids, include_passage, solved_ids)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/get/{problem_id}", response_model=FlashlightProblemResponseDTO)
 async def get_problem_by_id(
     problem_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
 ):
-    """Get a single flashlight problem by ID."""
-    problem: FlashlightProblemDB | None = db.query(FlashlightProblemDB).filter(
-        FlashlightProblemDB.id == problem_id
-    ).first()
+    """
+    Get a single flashlight problem by ID, served from the catalog snapshot.
 
-    if not problem:
+    Answers 304 when If-None-Match or If-Modified-Since still match the problem's row version.
+    """
+    snapshot = await catalog.snapshot()
+    if problem_id not in snapshot.entries:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Problem not found"
         )
-
-    return problem
+    etag, last_modified = snapshot.validators(problem_id)
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+    body = await catalog.problem_json(snapshot, problem_id, exclude_none=False)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/is_solved_by_user")
 async def is_solved_by_user(
     problem_id: int,
-    user: UserDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Check if the current user has solved a specific flashlight problem."""
-    for problem in user.flashlight_problems_solved:
-        if problem.id == problem_id:
-            return {"solved": True}
-    return {"solved": False}
+    is_solved = await db.scalar(
+        select(exists().where(solved_association.c.user_id == user.id,
+                            solved_association.c.flashlight_problem_id == problem_id))
+    )
+    return {"solved": is_solved}
+
+
+@router.get("/solved_status", response_model=SolvedStatusResponseDTO, response_model_exclude_none=True)
+async def get_solved_status(
+    ids: Optional[List[int]] = Query(None),
+    start_id: Optional[int] = None,
+    end_id: Optional[int] = None,
+    bitmap: bool = False,
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Solved status of many flashlight problems in one call, for a list of ids or for the range [start_id, end_id].
+
+    - **ids**: Problem ids to check (max 1000), returned as solved_ids
+    - **start_id** / **end_id**: Inclusive id range (at most 8000 ids) to check instead of ids
+    - **bitmap**: Answer a range as a base64 bitmap rather than a list of ids
+    """
+    column = solved_association.c.flashlight_problem_id
+    if ids:
+        if len(ids) > MAX_SOLVED_STATUS_IDS or bitmap:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Pass at most {MAX_SOLVED_STATUS_IDS} ids, bitmaps need start_id and end_id"
+            )
+        return SolvedStatusResponseDTO(solved_ids=await _load_solved_ids(db, user.id, column.in_(ids)))
+
+    if start_id is None or end_id is None or not 0 <= end_id - start_id < MAX_SOLVED_STATUS_RANGE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Pass ids, or start_id and end_id spanning at most {MAX_SOLVED_STATUS_RANGE} problems"
+        )
+    solved_ids = await _load_solved_ids(db, user.id, column.between(start_id, end_id))
+    if bitmap:
+        return SolvedStatusResponseDTO(
+            start_id=start_id,
+            end_id=end_id,
+            bitmap=encode_id_bitmap(start_id, end_id, solved_ids),
+        )
+    return SolvedStatusResponseDTO(solved_ids=solved_ids)
 
 
 @router.get("/get_all_problems_solved_by_user", response_model=List[FlashlightProblemResponseDTO])
 async def get_all_solved_problems_by_user(
-    user: UserDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all flashlight problems solved by the current user."""
-    return user.flashlight_problems_solved
+    result = await db.execute(
+        select(FlashlightProblemDB)
+        .join(solved_association, solved_association.c.flashlight_problem_id == FlashlightProblemDB.id)
+        .where(solved_association.c.user_id == user.id)
+        .order_by(FlashlightProblemDB.id.asc())
+    )
+    return result.scalars().all()
 
 
 @router.get("/get_user_track_status")
 async def get_user_flashlight_track_status(
-    user: UserDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get the current user's flashlight drill progress summary.
 
     Returns total problems, solved count, and unsolved count.
     """
-    total_problems = db.query(FlashlightProblemDB).count()
-    solved_problems = len(user.flashlight_problems_solved)
+    # counters are kept by triggers in the same transaction as every solve, reset, create and delete
+    total_problems, solved_problems = (await db.execute(track_status_query(FLASHLIGHT_CATALOG, user.id))).one()
 
     return {
         "total_problems": total_problems,
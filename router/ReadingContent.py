@@ -1,22 +1,41 @@
-from fastapi import Depends, APIRouter
-from sqlalchemy.orm import Session
+from fastapi import Depends, APIRouter, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
 
 from DTO.ReadingContent import ReadingContentDTO, ReadingContentResponseDTO
-from auth.auth import  require_admin
-from model.Base import get_db
-from model.ReadingContent import ReadingContentDB
-from model.User import UserDB
+from auth.auth import Principal, require_admin
+from model.Base import get_async_db, get_async_read_db
+from model.ReadingContent import ReadingContentDB, intern_passage
+from utils.conditional import make_etag, validator_headers, is_not_modified, not_modified
+from utils.request_metrics import TimedRoute
 
-router = APIRouter()
+# The text behind a passage id never changes, so clients and proxies may keep it for good
+PASSAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+router = APIRouter(route_class=TimedRoute)
 @router.post("/reading_content/create", response_model=ReadingContentResponseDTO)
 async def create_reading_content(input_data: ReadingContentDTO,
-                                 admin: UserDB = Depends(require_admin),
-                                 db: Session = Depends(get_db)):
-    new_content = ReadingContentDB()
-    new_content.content = input_data.content
-    db.add(new_content)
-    db.commit()
-    db.refresh(new_content)
-    return new_content
+                                 admin: Principal = Depends(require_admin),
+                                 db: AsyncSession = Depends(get_async_db)):
+    # Storing a passage that already exists returns the existing one
+    content_id = await db.run_sync(intern_passage, input_data.content)
+    await db.commit()
+    return await db.get(ReadingContentDB, content_id)
+
+
+@router.get("/reading_content/{content_id}", response_model=ReadingContentResponseDTO)
+async def get_reading_content(content_id: int,
+                              request: Request,
+                              response: Response,
+                              db: AsyncSession = Depends(get_async_read_db)):
+    content: ReadingContentDB | None = await db.get(ReadingContentDB, content_id)
+    if not content:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reading content not found")
+    etag = make_etag(content.content_hash)
+    headers = validator_headers(etag, cache_control=PASSAGE_CACHE_CONTROL)
+    if is_not_modified(request, etag):
+        return not_modified(headers)
+    response.headers.update(headers)
+    return content
 
-# delete reading content
\ No newline at end of file
+# delete reading content
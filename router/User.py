@@ -2,21 +2,24 @@ from datetime import timedelta
 
 from fastapi import Depends, HTTPException, APIRouter
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from DTO.User import UserCreateDTO, UserResponseDTO
-from auth.auth import Token, verify_password, ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_password_hash, \
-    get_current_user
+from auth.auth import Token, verify_password_async, ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, \
+    get_password_hash_async, get_current_user_row, require_admin, principal_cache, Principal
 from model.User import UserDB
-from model.Base import get_db
+from model.Base import get_async_db, get_async_read_db
+from utils.request_metrics import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(),
+                                 db: AsyncSession = Depends(get_async_read_db)):
+    user = (await db.execute(select(UserDB).where(UserDB.username == form_data.username))).scalars().first()
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -31,21 +34,27 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 
 
 @router.post("/register", response_model=UserResponseDTO)
-async def register_user(user: UserCreateDTO, db: Session = Depends(get_db)):
-    db_user = db.query(UserDB).filter(UserDB.username == user.username).first()
+async def register_user(user: UserCreateDTO, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(UserDB).where(UserDB.username == user.username))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = UserDB(username=user.username,
                       hashed_password=hashed_password,
                       )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
 @router.get("/users/me", response_model=UserResponseDTO)
-async def read_users_me(current_user: UserDB = Depends(get_current_user)):
+async def read_users_me(current_user: UserDB = Depends(get_current_user_row)):
     return current_user
+
+
+@router.get("/users/principal_cache_stats")
+async def read_principal_cache_stats(admin: Principal = Depends(require_admin)):
+    """Hit and miss counters of the authenticated principal cache (admin only)."""
+    return principal_cache.stats()
@@ -0,0 +1,83 @@
+"""Add the precomputed answer index columns to a database created before they existed and fill them in.
+
+New passages get their token offsets when stored and new and edited problems keep their index up to date
+on flush; run this once after upgrading, or any time an index looks out of sync. Safe to run more than once:
+
+    python -m script.build_answer_index
+"""
+
+from sqlalchemy import inspect, select, text, update, bindparam, Connection
+
+from model.Base import engine
+from model.EvidenceProblem import EvidenceProblemDB
+from model.FlashlightProblem import FlashlightProblemDB
+from model.ReadingContent import ReadingContentDB
+from utils.text_index import find_occurrences, find_token_range, token_offsets
+
+
+def _add_column(connection: Connection, table, column_ddl: str) -> None:
+    column_name = column_ddl.split()[0]
+    if column_name not in {column["name"] for column in inspect(connection).get_columns(table.name)}:
+        connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+        print(f"{table.name}: added {column_name}")
+
+
+def _store(connection: Connection, table, column_name: str, values: dict) -> None:
+    if values:
+        connection.execute(
+            update(table).where(table.c.id == bindparam("row_id"))
+            # the rows themselves did not change, keep updated_at and with it their ETags
+            .values({column_name: bindparam("value"), "updated_at": table.c.updated_at}),
+            [{"row_id": row_id, "value": value} for row_id, value in values.items()],
+        )
+
+
+def index_passages(connection: Connection) -> None:
+    table = ReadingContentDB.__table__
+    _add_column(connection, table, "token_index JSON")
+    # the text behind a passage never changes, only passages stored without offsets need them
+    rows = connection.execute(select(ReadingContentDB.id, ReadingContentDB.content)
+                              .where(ReadingContentDB.token_index.is_(None))).all()
+    _store(connection, table, "token_index", {passage_id: token_offsets(content) for passage_id, content in rows})
+    print(f"{table.name}: indexed {len(rows)} passages")
+
+
+def index_flashlight_targets(connection: Connection) -> None:
+    _add_column(connection, FlashlightProblemDB.__table__, "target_spans JSON NOT NULL DEFAULT '[]'")
+    rows = connection.execute(
+        select(FlashlightProblemDB.id, FlashlightProblemDB.target, ReadingContentDB.content)
+        .join(ReadingContentDB, ReadingContentDB.id == FlashlightProblemDB.reading_content_id)
+    ).all()
+    table = FlashlightProblemDB.__table__
+    spans = {problem_id: find_occurrences(content, target) for problem_id, target, content in rows}
+    _store(connection, table, "target_spans", spans)
+    missing = sum(1 for problem_spans in spans.values() if not problem_spans)
+    print(f"{table.name}: indexed {len(spans)} targets, {missing} do not occur in their passage")
+
+
+def index_evidence(connection: Connection) -> None:
+    table = EvidenceProblemDB.__table__
+    _add_column(connection, table, "evidence_tokens JSON")
+    if "evidence_index" in {column["name"] for column in inspect(connection).get_columns(table.name)}:
+        # the passage offsets it repeated on every problem are on reading_content_table now
+        connection.execute(text(f"ALTER TABLE {table.name} DROP COLUMN evidence_index"))
+        print(f"{table.name}: dropped evidence_index")
+    rows = connection.execute(
+        select(EvidenceProblemDB.id, EvidenceProblemDB.evidence, ReadingContentDB.content)
+        .join(ReadingContentDB, ReadingContentDB.id == EvidenceProblemDB.reading_content_id)
+    ).all()
+    ranges = {problem_id: find_token_range(content, evidence) for problem_id, evidence, content in rows}
+    _store(connection, table, "evidence_tokens", ranges)
+    missing = sum(1 for token_range in ranges.values() if token_range is None)
+    print(f"{table.name}: indexed {len(ranges)} evidences, {missing} do not occur in their passage")
+
+
+def main() -> None:
+    with engine.begin() as connection:
+        index_passages(connection)
+        index_flashlight_targets(connection)
+        index_evidence(connection)
+
+
+if __name__ == "__main__":
+    main()
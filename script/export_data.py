@@ -0,0 +1,34 @@
+"""Export a problem table or a user-problem association table as NDJSON or CSV, streamed to a file or stdout.
+
+    python -m script.export_data evidence_problems [--format csv] [--output evidence.csv]
+
+Problem exports in NDJSON import back with script.import_problems.
+"""
+
+import argparse
+import sys
+
+from bulk.exporter import EXPORTS, EXPORT_MEDIA_TYPES, export_chunks
+from model.Base import SessionLocal
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a table as NDJSON or CSV.")
+    parser.add_argument("name", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=sorted(EXPORT_MEDIA_TYPES), default="ndjson")
+    parser.add_argument("--output", default="-", help="file to write, - for stdout")
+    args = parser.parse_args()
+
+    target = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    session = SessionLocal()
+    try:
+        for chunk in export_chunks(session, args.name, args.format):
+            target.write(chunk)
+    finally:
+        session.close()
+        if target is not sys.stdout.buffer:
+            target.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Generate a production-sized dataset of users, problems and solve history, reproducible from a seed.
+
+    python -m script.gen_scale_data --reset --users 100000 --evidence-problems 700000 \\
+        --flashlight-problems 300000 --solves 10000000 --seed 42
+
+Passages are mostly paragraph length with a share of full exam passages, and several problems share each
+passage. Problem popularity follows a Zipf law and solves per user a Pareto law, so a few problems and
+a few users account for most of the history, as in production.
+
+Rows go in through executemany batches with the search and counter triggers dropped; the FTS indexes
+and the progress counters are rebuilt once at the end. Passage hashes and answer indexes are computed
+while generating. Every user's password is password<N>, with N = id % --password-variants: only that
+many argon2 hashes are computed, in parallel.
+"""
+
+import argparse
+import itertools
+import math
+import random
+import time
+
+from faker.providers.lorem.en_US import Provider
+from sqlalchemy import insert, select, func, text
+
+from auth.auth import get_hash_pool, get_password_hash, shutdown_hash_pool
+from model.Base import Base, engine, reset_db, user_evidence_problem_association, user_flashlight_problem_association
+from model.EvidenceProblem import EvidenceProblemDB
+from model.FlashlightProblem import FlashlightProblemDB
+from model.Progress import create_progress_triggers, drop_progress_triggers, recompute_progress
+from model.ReadingContent import ReadingContentDB, hash_content
+from model.Search import create_search_indexes, drop_search_indexes, rebuild_search_indexes
+from model.User import UserDB
+from utils.text_index import find_occurrences
+
+WORDS = tuple(Provider.word_list)
+# Share of full exam passages among the paragraph-length ones
+LONG_PASSAGE_SHARE = 0.1
+ZIPF_EXPONENT = 1.1
+PARETO_ALPHA = 2.0
+
+
+class Passage:
+    """Generated passage text with its token offsets, known from construction instead of re-tokenized"""
+
+    def __init__(self, rng: random.Random):
+        if rng.random() < LONG_PASSAGE_SHARE:
+            word_count = rng.randint(650, 950)
+        else:
+            word_count = min(max(int(rng.lognormvariate(math.log(110), 0.35)), 40), 300)
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+        self.sentences: list[tuple[int, int]] = []  # [first, last) word indexes
+        parts = []
+        position = 0
+        while len(self.starts) < word_count:
+            words = rng.choices(WORDS, k=min(rng.randint(8, 24), word_count - len(self.starts)))
+            words[0] = words[0].capitalize()
+            self.sentences.append((len(self.starts), len(self.starts) + len(words)))
+            for word in words:
+                self.starts.append(position)
+                self.ends.append(position + len(word))
+                position += len(word) + 1
+            words[-1] += "."
+            parts.append(" ".join(words))
+            position += 1  # the period; the space after it is counted with the last word
+        self.text = " ".join(parts)
+        self.content_hash = hash_content(self.text)
+
+    def span_text(self, first: int, last: int) -> str:
+        return self.text[self.starts[first]:self.ends[last - 1]]
+
+
+def _evidence_row(rng: random.Random, problem_id: int, passage_id: int, passage: Passage) -> dict:
+    first, last = rng.choice(passage.sentences)
+    evidence = passage.span_text(first, last)
+    cue_words = rng.sample(evidence.lower().rstrip(".").split(), k=min(2, last - first))
+    options = [" ".join(rng.choices(WORDS, k=rng.randint(3, 6))) for _ in range(4)]
+    correct_option = rng.randrange(4)
+    options[correct_option] = " ".join(cue_words + rng.choices(WORDS, k=2))
+    return {
+        "id": problem_id,
+        "problem_statement": f"What does the passage say about {' and '.join(cue_words)}?",
+        "reading_content_id": passage_id,
+        "evidence": evidence,
+        "options": options,
+        "correct_option": correct_option,
+        "evidence_tokens": [first, last],
+    }
+
+
+def _flashlight_row(rng: random.Random, problem_id: int, passage_id: int, passage: Passage) -> dict:
+    length = rng.randint(1, 3)
+    first = rng.randrange(len(passage.starts) - length + 1)
+    target = passage.span_text(first, first + length).replace(".", "").lower()
+    return {
+        "id": problem_id,
+        "problem_statement": f"Find the phrase '{target}' in the passage",
+        "reading_content_id": passage_id,
+        "target": target,
+        "target_spans": find_occurrences(passage.text, target),
+    }
+
+
+class BatchWriter:
+    """executemany inserts of batch_size rows per table, each batch its own transaction"""
+
+    def __init__(self, connection, batch_size: int):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.pending: dict = {}
+        self.counts: dict[str, int] = {}
+
+    def add(self, table, row: dict) -> None:
+        rows = self.pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        for table, rows in self.pending.items():
+            if rows:
+                self.connection.execute(insert(table), rows)
+                self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+        self.pending = {}
+        self.connection.commit()
+
+
+def username(user_id: int) -> str:
+    return f"user{user_id:07d}"
+
+
+def user_password(user_id: int, password_variants: int) -> str:
+    return f"password{user_id % password_variants}"
+
+
+def generate_users(writer: BatchWriter, count: int, password_variants: int) -> None:
+    passwords = [user_password(variant, password_variants) for variant in range(password_variants)]
+    try:
+        hashes = list(get_hash_pool().map(get_password_hash, passwords))
+    finally:
+        shutdown_hash_pool()
+    table = UserDB.__table__
+    for user_id in range(1, count + 1):
+        writer.add(table, {"id": user_id, "username": username(user_id),
+                           "hashed_password": hashes[user_id % password_variants], "role": "user"})
+    writer.flush()
+
+
+def generate_problems(writer: BatchWriter, rng: random.Random, evidence_count: int, flashlight_count: int,
+                      problems_per_passage: int) -> None:
+    total = evidence_count + flashlight_count
+    passage_count = max(math.ceil(total / problems_per_passage), 1)
+    evidence_id = flashlight_id = 0
+    problem = 0
+    for passage_id in range(1, passage_count + 1):
+        passage = Passage(rng)
+        writer.add(ReadingContentDB.__table__,
+                   {"id": passage_id, "content": passage.text, "content_hash": passage.content_hash,
+                    "token_index": {"starts": passage.starts, "ends": passage.ends}})
+        # an even share of the problems per passage, and flashlight problems spread evenly among them
+        for problem in range(problem, total * passage_id // passage_count):
+            if (problem + 1) * flashlight_count // total > problem * flashlight_count // total:
+                flashlight_id += 1
+                writer.add(FlashlightProblemDB.__table__, _flashlight_row(rng, flashlight_id, passage_id, passage))
+            else:
+                evidence_id += 1
+                writer.add(EvidenceProblemDB.__table__, _evidence_row(rng, evidence_id, passage_id, passage))
+        problem = total * passage_id // passage_count
+    writer.flush()
+
+
+def _solve_counts(rng: random.Random, users: int, total: int, cap: int) -> list[int]:
+    """Solves per user, Pareto distributed, summing to total and at most cap each"""
+    if users == 0 or cap == 0:
+        return [0] * users
+    total = min(total, users * cap)
+    raw = [rng.paretovariate(PARETO_ALPHA) for _ in range(users)]
+    scale = total / sum(raw)
+    counts = [min(int(weight * scale), cap) for weight in raw]
+    short = total - sum(counts)
+    while short > 0:
+        for user in rng.sample(range(users), users):
+            if counts[user] < cap:
+                counts[user] += 1
+                short -= 1
+                if short == 0:
+                    break
+    return counts
+
+
+def generate_solves(writer: BatchWriter, rng: random.Random, users: int, association, problem_column: str,
+                    problem_count: int, total: int) -> None:
+    if problem_count == 0 or users == 0:
+        return
+    # the most popular problems are not simply the oldest ones
+    by_popularity = list(range(1, problem_count + 1))
+    rng.shuffle(by_popularity)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(problem_count)))
+    for user_index, count in enumerate(_solve_counts(rng, users, total, problem_count)):
+        if count * 2 > problem_count:
+            # nearly everything: popularity barely matters and rejection sampling would crawl
+            solved = rng.sample(by_popularity, count)
+        else:
+            solved = set()
+            while len(solved) < count:
+                solved.update(rng.choices(by_popularity, cum_weights=cum_weights, k=count - len(solved)))
+        for problem_id in solved:
+            writer.add(association, {"user_id": user_index + 1, problem_column: problem_id})
+    writer.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a large, reproducible dataset.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--evidence-problems", type=int, default=7000)
+    parser.add_argument("--flashlight-problems", type=int, default=3000)
+    parser.add_argument("--solves", type=int, default=100000, help="user-problem solves over both kinds")
+    parser.add_argument("--problems-per-passage", type=int, default=4)
+    parser.add_argument("--password-variants", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=20000, help="rows per insert transaction")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset_db()
+    else:
+        Base.metadata.create_all(bind=engine)
+        with engine.connect() as connection:
+            if connection.scalar(select(func.count()).select_from(UserDB)):
+                parser.error("the database already has users, pass --reset to replace everything")
+
+    rng = random.Random(args.seed)
+    started = time.monotonic()
+    with engine.connect() as connection:
+        # a generated dataset can be regenerated, skip the fsyncs
+        connection.execute(text("PRAGMA synchronous=OFF"))
+        drop_search_indexes(connection)
+        drop_progress_triggers(connection)
+        connection.commit()
+        writer = BatchWriter(connection, args.batch_size)
+
+        generate_users(writer, args.users, args.password_variants)
+        print(f"users: {time.monotonic() - started:.1f}s")
+        generate_problems(writer, rng, args.evidence_problems, args.flashlight_problems, args.problems_per_passage)
+        print(f"passages and problems: {time.monotonic() - started:.1f}s")
+        problems = args.evidence_problems + args.flashlight_problems
+        evidence_solves = args.solves * args.evidence_problems // problems if problems else 0
+        generate_solves(writer, rng, args.users, user_evidence_problem_association, "evidence_problem_id",
+                        args.evidence_problems, evidence_solves)
+        generate_solves(writer, rng, args.users, user_flashlight_problem_association, "flashlight_problem_id",
+                        args.flashlight_problems, args.solves - evidence_solves)
+        print(f"solves: {time.monotonic() - started:.1f}s")
+
+        create_search_indexes(connection)
+        rebuild_search_indexes(connection)
+        create_progress_triggers(connection)
+        recompute_progress(connection)
+        connection.execute(text("ANALYZE"))
+        connection.commit()
+        print(f"search indexes and counters: {time.monotonic() - started:.1f}s")
+
+    for table, count in writer.counts.items():
+        print(f"  {table}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
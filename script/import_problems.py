@@ -0,0 +1,36 @@
+"""Bulk import evidence or flashlight problems from an NDJSON file, one create DTO object per line.
+
+    python -m script.import_problems evidence problems.ndjson [--batch-size 1000]
+    python -m script.import_problems flashlight - < drills.jsonl
+
+Same rules as the /import routes: invalid rows and duplicates are skipped and counted in the report.
+"""
+
+import argparse
+import json
+import sys
+
+from bulk.importer import IMPORT_BATCH_SIZE, IMPORT_KINDS, import_lines
+from model.Base import SessionLocal
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import problems from NDJSON.")
+    parser.add_argument("kind", choices=sorted(IMPORT_KINDS))
+    parser.add_argument("path", help="NDJSON file, - for stdin")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="rows per transaction")
+    args = parser.parse_args()
+
+    source = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    session = SessionLocal()
+    try:
+        report = import_lines(session, args.kind, source, args.batch_size)
+    finally:
+        session.close()
+        if source is not sys.stdin.buffer:
+            source.close()
+    print(json.dumps(report.as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
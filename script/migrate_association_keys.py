@@ -0,0 +1,55 @@
+"""Give the user/problem association tables their composite primary key and reverse index.
+
+Databases created before the keys existed may hold duplicate (user, problem) rows; they are collapsed
+into one while the data is copied into the new table, and the progress counters are recomputed.
+Safe to run more than once:
+
+    python -m script.migrate_association_keys
+"""
+
+from sqlalchemy import inspect, text, Connection, Table
+
+from model.Base import Base, engine, user_evidence_problem_association, user_flashlight_problem_association
+from model.Progress import create_progress_triggers, drop_progress_triggers, recompute_progress
+from script.migrate_passages import rename_to_old
+
+
+def migrate_table(connection: Connection, table: Table) -> None:
+    name = table.name
+    if inspect(connection).get_pk_constraint(name)["constrained_columns"]:
+        print(f"{name}: already keyed, skipping")
+        return
+
+    columns = ", ".join(column.name for column in table.columns)
+    not_null = " AND ".join(f"{column.name} IS NOT NULL" for column in table.columns)
+    before = connection.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar_one()
+
+    rename_to_old(connection, name)
+    table.create(connection)
+    connection.execute(text(
+        f"INSERT OR IGNORE INTO {name} ({columns}) SELECT {columns} FROM {name}_old WHERE {not_null}"
+    ))
+    connection.execute(text(f"DROP TABLE {name}_old"))
+
+    after = connection.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar_one()
+    print(f"{name}: kept {after} rows, removed {before - after} duplicate or incomplete rows")
+
+
+def main() -> None:
+    with engine.begin() as connection:
+        # a rename would carry the counter triggers off to the _old table and drop them with it
+        drop_progress_triggers(connection)
+        Base.metadata.create_all(connection)
+        for table in (user_evidence_problem_association, user_flashlight_problem_association):
+            if inspect(connection).has_table(table.name):
+                migrate_table(connection, table)
+            else:
+                table.create(connection)
+                print(f"{table.name}: created")
+        create_progress_triggers(connection)
+        # duplicate rows were counted as solves
+        recompute_progress(connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Move the passages stored inline on every problem row into the content-addressed reading_content_table.
+
+Identical passages, within and across the problem tables and in the existing reading_content_table rows,
+collapse into one row keyed by content_hash, and each problem keeps its reading_content_id.
+The search indexes are rebuilt for the new layout and the progress counters recomputed. Safe to run more than once:
+
+    python -m script.migrate_passages
+"""
+
+from sqlalchemy import inspect, text, Connection, Table
+
+from model.Base import Base, engine
+from model.EvidenceProblem import EvidenceProblemDB
+from model.FlashlightProblem import FlashlightProblemDB
+from model.Progress import create_progress_triggers, drop_progress_triggers, recompute_progress
+from model.ReadingContent import ReadingContentDB, hash_content
+from model.Search import create_search_indexes, drop_search_indexes, rebuild_search_indexes
+
+PASSAGES = ReadingContentDB.__tablename__
+
+
+def _columns(connection: Connection, name: str) -> set[str]:
+    return {column["name"] for column in inspect(connection).get_columns(name)}
+
+
+def rename_to_old(connection: Connection, name: str) -> None:
+    # legacy mode keeps foreign keys in other tables pointing at the name, not at the renamed table
+    connection.execute(text("PRAGMA legacy_alter_table=ON"))
+    connection.execute(text(f"ALTER TABLE {name} RENAME TO {name}_old"))
+    connection.execute(text("PRAGMA legacy_alter_table=OFF"))
+    # indexes keep their names across a rename, the new table needs them back
+    for index in connection.execute(text(f"PRAGMA index_list({name}_old)")).mappings():
+        if index["origin"] == "c":
+            connection.execute(text(f"DROP INDEX {index['name']}"))
+
+
+def migrate_reading_content(connection: Connection) -> None:
+    if "content_hash" in _columns(connection, PASSAGES):
+        print(f"{PASSAGES}: already content-addressed, skipping")
+        return
+
+    table: Table = ReadingContentDB.__table__
+    # columns added after the passages moved are filled in by their own migrations, as on the problem tables
+    existing = _columns(connection, PASSAGES)
+    columns = ", ".join(column.name for column in table.columns if column.name in existing)
+    before = connection.execute(text(f"SELECT COUNT(*) FROM {PASSAGES}")).scalar_one()
+
+    rename_to_old(connection, PASSAGES)
+    table.create(connection)
+    # the oldest row of each text keeps its id
+    connection.execute(text(
+        f"INSERT INTO {PASSAGES} ({columns}, content_hash) "
+        f"SELECT {columns}, content_hash(content) FROM {PASSAGES}_old WHERE content IS NOT NULL ORDER BY id "
+        f"ON CONFLICT(content_hash) DO NOTHING"
+    ))
+    connection.execute(text(f"DROP TABLE {PASSAGES}_old"))
+
+    after = connection.execute(text(f"SELECT COUNT(*) FROM {PASSAGES}")).scalar_one()
+    print(f"{PASSAGES}: kept {after} rows, removed {before - after} duplicate or empty rows")
+
+
+def migrate_problem_table(connection: Connection, table: Table) -> None:
+    name = table.name
+    if "reading_content" not in _columns(connection, name):
+        print(f"{name}: already references {PASSAGES}, skipping")
+        return
+
+    passages_before = connection.execute(text(f"SELECT COUNT(*) FROM {PASSAGES}")).scalar_one()
+    connection.execute(text(
+        f"INSERT INTO {PASSAGES} (content, content_hash) "
+        f"SELECT reading_content, content_hash(reading_content) FROM {name} "
+        f"WHERE reading_content IS NOT NULL ORDER BY id "
+        f"ON CONFLICT(content_hash) DO NOTHING"
+    ))
+    passages_after = connection.execute(text(f"SELECT COUNT(*) FROM {PASSAGES}")).scalar_one()
+
+    # columns added after the passages moved keep their defaults, their own migrations fill them in
+    existing = _columns(connection, name)
+    copied = [column.name for column in table.columns if column.name in existing]
+    columns = ", ".join(copied)
+    old_columns = ", ".join(f"o.{column}" for column in copied)
+    rename_to_old(connection, name)
+    table.create(connection)
+    connection.execute(text(
+        f"INSERT INTO {name} ({columns}, reading_content_id) "
+        f"SELECT {old_columns}, p.id FROM {name}_old o "
+        f"JOIN {PASSAGES} p ON p.content_hash = content_hash(o.reading_content) ORDER BY o.id"
+    ))
+    problems = connection.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar_one()
+    connection.execute(text(f"DROP TABLE {name}_old"))
+    print(f"{name}: {problems} problems now share {passages_after - passages_before} new passages")
+
+
+def main() -> None:
+    with engine.begin() as connection:
+        connection.connection.driver_connection.create_function("content_hash", 1, hash_content, deterministic=True)
+        # the triggers read and write columns that are about to move
+        drop_search_indexes(connection)
+        drop_progress_triggers(connection)
+        Base.metadata.create_all(connection)
+
+        migrate_reading_content(connection)
+        for table in (EvidenceProblemDB.__table__, FlashlightProblemDB.__table__):
+            migrate_problem_table(connection, table)
+
+        create_search_indexes(connection)
+        rebuild_search_indexes(connection)
+        create_progress_triggers(connection)
+        recompute_progress(connection)
+
+    # hand the space of the inline copies back to the file system
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM"))
+    print("Rebuilt search indexes and progress counters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Precompute the `stuck` and per-option `wrong_answer` hints of every evidence problem into assistant_hint_table.
+
+Hints already stored are skipped, so an interrupted or partly failed run is finished by running it again:
+
+    python -m script.precompute_hints [--concurrency 4] [--after-id 0] [--force]
+
+The server serves them from the database when ASSISTANT_HINT_CACHE_PERSIST is set.
+"""
+
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from assistant.hints import ASSISTANT_HINT_CACHE_PERSIST
+from assistant.llm import ASSISTANT_MAX_CONCURRENCY, close_openai_client
+from assistant.precompute import ProblemHintSource, precompute_problem_hints
+from model.Base import async_read_session_scope, dispose_engines
+from model.EvidenceProblem import EvidenceProblemDB
+
+
+async def run(concurrency: int, after_id: int, batch_size: int, force: bool) -> None:
+    slots = asyncio.Semaphore(concurrency)
+    generated = skipped = failed = 0
+    while True:
+        async with async_read_session_scope() as db:
+            problems = (await db.scalars(
+                select(EvidenceProblemDB).where(EvidenceProblemDB.id > after_id)
+                .order_by(EvidenceProblemDB.id).limit(batch_size)
+            )).all()
+            sources = [(problem.id, ProblemHintSource.of(problem)) for problem in problems]
+        if not sources:
+            break
+        for counts in await asyncio.gather(*(precompute_problem_hints(source, slots, force) for _, source in sources)):
+            generated, skipped, failed = generated + counts[0], skipped + counts[1], failed + counts[2]
+        after_id = sources[-1][0]
+        print(f"Up to problem {after_id}: {generated} generated, {skipped} already stored, {failed} failed")
+    if failed:
+        print("Some hints failed, run again to retry them")
+    if not ASSISTANT_HINT_CACHE_PERSIST:
+        print("Note: set ASSISTANT_HINT_CACHE_PERSIST for the server to serve the stored hints")
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    try:
+        await run(args.concurrency, args.after_id, args.batch_size, args.force)
+    finally:
+        await close_openai_client()
+        await dispose_engines()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute assistant hints for every evidence problem.")
+    parser.add_argument("--concurrency", type=int, default=min(4, ASSISTANT_MAX_CONCURRENCY),
+                        help="upstream calls at once, at most ASSISTANT_MAX_CONCURRENCY")
+    parser.add_argument("--after-id", type=int, default=0, help="start after this problem id")
+    parser.add_argument("--batch-size", type=int, default=50, help="problems loaded and processed together")
+    parser.add_argument("--force", action="store_true", help="regenerate hints that are already stored")
+    args = parser.parse_args()
+    if not 1 <= args.concurrency <= ASSISTANT_MAX_CONCURRENCY:
+        parser.error(f"--concurrency must be between 1 and {ASSISTANT_MAX_CONCURRENCY}")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""Create the FTS5 search indexes if missing and backfill them from the existing problem rows.
+
+Run once on a database created before full-text search existed, or any time the index looks out of sync:
+
+    python -m script.rebuild_search_index
+"""
+
+from model.Base import engine
+from model.Search import SEARCH_INDEXES, create_search_indexes, rebuild_search_indexes
+
+
+def main() -> None:
+    with engine.begin() as connection:
+        create_search_indexes(connection)
+        rebuild_search_indexes(connection)
+    print(f"Rebuilt search indexes: {', '.join(SEARCH_INDEXES)}")
+
+
+if __name__ == "__main__":
+    main()
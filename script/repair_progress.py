@@ -0,0 +1,28 @@
+"""Recompute the per-user progress counters and the catalog counts from scratch.
+
+Run once on a database created before the counters existed, or any time they look out of sync:
+
+    python -m script.repair_progress
+"""
+
+from sqlalchemy import select, func
+
+from model.Base import engine
+from model.Progress import UserProgressDB, CatalogCountDB, create_progress_triggers, recompute_progress
+
+
+def main() -> None:
+    UserProgressDB.__table__.create(bind=engine, checkfirst=True)
+    CatalogCountDB.__table__.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        create_progress_triggers(connection)
+        recompute_progress(connection)
+        users = connection.scalar(select(func.count()).select_from(UserProgressDB))
+        catalogs = connection.execute(select(CatalogCountDB.name, CatalogCountDB.count)).all()
+    print(f"Recomputed progress for {users} users")
+    for name, count in catalogs:
+        print(f"  {name}: {count} problems")
+
+
+if __name__ == "__main__":
+    main()
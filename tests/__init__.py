@@ -0,0 +1,21 @@
+"""Shared environment of the test modules.
+
+model.Base and the assistant read their settings on import, and a test run imports them once for every module,
+so the database and the settings the modules rely on are set here, before any of them imports the app.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+_data_dir = tempfile.mkdtemp(prefix="package-tests-")
+atexit.register(shutil.rmtree, _data_dir, ignore_errors=True)
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_data_dir, 'test.db')}"
+os.environ.setdefault("AUTH_SECRET", "tests")
+os.environ["REQUEST_METRICS"] = "1"
+# hints go through a stub model, the key only has to be set
+os.environ["OPENAI_API_KEY"] = "tests"
+os.environ["ASSISTANT_HINT_CACHE_PERSIST"] = "1"
+os.environ["ASSISTANT_PRECOMPUTE_HINTS"] = "1"
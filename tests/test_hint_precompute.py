@@ -0,0 +1,94 @@
+"""Precomputed hints must be the ones /assistant/suggest/problem asks for.
+
+    python -m unittest tests.test_hint_precompute
+
+Creating a problem precomputes its hints through a stub model; the live requests that follow must be answered
+from the persistent hint tier without another upstream call, whatever the student has selected.
+"""
+
+import unittest
+
+from fastapi.testclient import TestClient
+
+from assistant.hints import hint_cache
+from auth.auth import create_access_token, get_password_hash
+from bench.stub_llm import STUB_SUGGESTION, install_stub_llm
+from main import app
+from model.Base import SessionLocal, reset_db
+from model.Catalog import _passage_cache
+from model.User import UserDB
+from router.EvidenceProblem import catalog as evidence_catalog
+
+# long enough that the window around the evidence leaves out the sentence the student selects
+PASSAGE = " ".join(f"Sentence {number} is about the hive." for number in range(20)).replace(
+    "Sentence 3 is about the hive.", "The colony clusters together in winter."
+)
+PROBLEM = {
+    "problem_statement": "What does the colony do in winter?",
+    "reading_content": PASSAGE,
+    "evidence": "The colony clusters together in winter.",
+    "options": ["Sleeps", "Clusters together", "Leaves the hive"],
+    "correct_option": 1,
+}
+SELECTION = "Sentence 17 is about the hive."
+
+
+def setUpModule() -> None:
+    reset_db()
+    session = SessionLocal()
+    try:
+        session.add(UserDB(username="admin", hashed_password=get_password_hash("password"), role="admin"))
+        session.commit()
+    finally:
+        session.close()
+    # snapshots and passages another test module cached are of a database that is gone
+    evidence_catalog.invalidate()
+    _passage_cache.clear()
+
+
+class PrecomputedHintTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.client = TestClient(app)
+        cls.client.__enter__()
+        install_stub_llm(latency_ms=0)
+        auth = {"Authorization": f"Bearer {create_access_token(data={'sub': 'admin'})}"}
+        # the background precompute has run by the time the create request returns
+        response = cls.client.post("/evidence_problem/create", json=PROBLEM, headers=auth)
+        response.raise_for_status()
+        cls.problem_id = response.json()["id"]
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.client.__exit__(None, None, None)
+
+    def setUp(self) -> None:
+        # served by the persistent tier, as a worker that did not precompute them would be
+        hint_cache.memory.clear()
+
+    def suggest(self, **body) -> dict:
+        upstream_calls = hint_cache.upstream_calls
+        response = self.client.post("/assistant/suggest/problem", json={
+            "problemType": "evidence", "problemId": self.problem_id, **body,
+        })
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(hint_cache.upstream_calls, upstream_calls)
+        return response.json()
+
+    def test_stuck_with_selection(self):
+        for selection in ("", SELECTION):
+            with self.subTest(selection=selection):
+                response = self.suggest(situation="stuck", userSelectedText=selection)
+                self.assertEqual(response["source"], "cache")
+                self.assertEqual(response["suggestion"], STUB_SUGGESTION)
+
+    def test_wrong_answer_with_selection(self):
+        for option in (0, 2):
+            with self.subTest(option=option):
+                response = self.suggest(situation="wrong_answer", userAnswer=option, userSelectedText=SELECTION)
+                self.assertEqual(response["source"], "cache")
+
+
+if __name__ == "__main__":
+    unittest.main()
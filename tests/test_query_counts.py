@@ -0,0 +1,154 @@
+"""Query budgets of the hot routes, so an N+1 or an extra round trip fails here instead of in production.
+
+    python -m unittest tests.test_query_counts
+
+Seeds the temporary SQLite database of the tests package with enough problems and solves that a per-row query
+would blow every budget, and serves the app in-process through TestClient.
+"""
+
+import unittest
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from auth.auth import create_access_token, get_password_hash, principal_cache
+from main import app
+from model.Base import SessionLocal, reset_db, user_evidence_problem_association, \
+    user_flashlight_problem_association
+from model.Catalog import _passage_cache
+from model.EvidenceProblem import EvidenceProblemDB
+from model.FlashlightProblem import FlashlightProblemDB
+from model.User import UserDB
+from router.EvidenceProblem import catalog as evidence_catalog
+from router.FlashlightProblem import catalog as flashlight_catalog
+from utils.request_metrics import max_queries
+
+PASSAGES = 5
+PROBLEMS = 60
+PAGE_SIZE = 50
+SOLVED = 25
+
+KINDS = ("evidence", "flashlight")
+
+
+def _seed() -> None:
+    reset_db()
+    session = SessionLocal()
+    try:
+        # one hash for everyone; the tests sign their tokens instead of logging in
+        session.add(UserDB(username="student", hashed_password=get_password_hash("password")))
+        for number in range(PROBLEMS):
+            passage = f"Passage {number % PASSAGES}. The colony clusters together in winter. Honey is stored."
+            session.add(EvidenceProblemDB(
+                problem_statement=f"What does the colony do {number}?",
+                reading_content=passage,
+                evidence="The colony clusters together",
+                options=["Sleeps", "Clusters together"],
+                correct_option=1,
+            ))
+            session.add(FlashlightProblemDB(
+                problem_statement=f"Find the honey {number}",
+                reading_content=passage,
+                target="honey",
+            ))
+        session.commit()
+        for association, column in ((user_evidence_problem_association, "evidence_problem_id"),
+                                    (user_flashlight_problem_association, "flashlight_problem_id")):
+            session.execute(insert(association), [{"user_id": 1, column: problem_id}
+                                                  for problem_id in range(1, SOLVED + 1)])
+        session.commit()
+    finally:
+        session.close()
+
+
+def setUpModule() -> None:
+    _seed()
+    # snapshots another test module built are of a database that is gone
+    evidence_catalog.invalidate()
+    flashlight_catalog.invalidate()
+
+
+class QueryCountTest(unittest.TestCase):
+    """
+    Budgets are for cold caches: the caller's principal costs one lookup and the passages of a page one
+    batched lookup on top of the route's own queries.
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.client = TestClient(app)
+        cls.client.__enter__()
+        cls.auth = {"Authorization": f"Bearer {create_access_token(data={'sub': 'student'})}"}
+        # the catalog snapshots are built by the first read, not by the requests measured here
+        for kind in KINDS:
+            cls.client.get(f"/{kind}_problem/all").raise_for_status()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.client.__exit__(None, None, None)
+
+    def setUp(self) -> None:
+        principal_cache.clear()
+        _passage_cache.clear()
+
+    def request(self, limit: int, method: str, url: str, **kwargs):
+        with max_queries(limit) as requests:
+            response = self.client.request(method, url, **kwargs)
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(len(requests), 1)
+        return response
+
+    def test_all(self):
+        for kind in KINDS:
+            with self.subTest(kind=kind):
+                response = self.request(1, "GET", f"/{kind}_problem/all", params={"page_size": PAGE_SIZE})
+                self.assertEqual(len(response.json()), PAGE_SIZE)
+                _passage_cache.clear()
+                # the principal, the solved flags of the whole page and its passages
+                response = self.request(3, "GET", f"/{kind}_problem/all",
+                                        params={"page_size": PAGE_SIZE, "with_solved": True}, headers=self.auth)
+                self.assertEqual(sum(problem["solved"] for problem in response.json()), SOLVED)
+
+    def test_search(self):
+        for kind in KINDS:
+            with self.subTest(kind=kind):
+                self.request(1, "GET", f"/{kind}_problem/search", params={"limit": PAGE_SIZE})
+                _passage_cache.clear()
+                # the full-text lookup and the passages
+                response = self.request(2, "GET", f"/{kind}_problem/search", params={"q": "passage", "limit": PAGE_SIZE})
+                self.assertEqual(len(response.json()), PAGE_SIZE)
+                _passage_cache.clear()
+                self.request(4, "GET", f"/{kind}_problem/search",
+                             params={"q": "passage", "limit": PAGE_SIZE, "with_solved": True}, headers=self.auth)
+
+    def test_get(self):
+        for kind in KINDS:
+            with self.subTest(kind=kind):
+                self.request(1, "GET", f"/{kind}_problem/get/{PROBLEMS}")
+
+    def test_is_solved_by_user(self):
+        for kind in KINDS:
+            # PROBLEMS itself is marked solved by test_solved_by_user
+            for problem_id, solved in ((1, True), (PROBLEMS - 1, False)):
+                with self.subTest(kind=kind, problem_id=problem_id):
+                    principal_cache.clear()
+                    response = self.request(2, "GET", f"/{kind}_problem/is_solved_by_user",
+                                            params={"problem_id": problem_id}, headers=self.auth)
+                    self.assertIs(response.json()["solved"], solved)
+
+    def test_solved_by_user(self):
+        for kind in KINDS:
+            with self.subTest(kind=kind):
+                # the principal, the existence check and the insert
+                self.request(3, "POST", f"/{kind}_problem/solved_by_user",
+                             params={"question_id": PROBLEMS}, headers=self.auth)
+
+    def test_get_user_track_status(self):
+        for kind in KINDS:
+            with self.subTest(kind=kind):
+                response = self.request(2, "GET", f"/{kind}_problem/get_user_track_status", headers=self.auth)
+                self.assertEqual(response.json()["total_problems"], PROBLEMS)
+
+
+if __name__ == "__main__":
+    unittest.main()
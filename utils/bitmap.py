@@ -0,0 +1,14 @@
+import base64
+from typing import Iterable
+
+
+def encode_id_bitmap(start_id: int, end_id: int, ids: Iterable[int]) -> str:
+    """
+    Base64 bitmap over the inclusive id range [start_id, end_id].
+    Bit i, least significant bit first within each byte, is set when start_id + i is in ids.
+    """
+    bits = bytearray((end_id - start_id) // 8 + 1)
+    for problem_id in ids:
+        offset = problem_id - start_id
+        bits[offset >> 3] |= 1 << (offset & 7)
+    return base64.b64encode(bytes(bits)).decode()
@@ -0,0 +1,99 @@
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Stop calling an upstream that keeps failing or answering slowly.
+
+    The outcome of the last `window` calls is kept; a call is bad when it raises or takes at least
+    `slow_call_seconds`. Once at least `min_calls` were seen and the bad share reaches `failure_ratio`
+    the circuit opens and calls fail fast for `open_seconds`. After that a single probe call is let through:
+    a good probe closes the circuit, a bad one opens it again.
+
+    Not thread safe, it is meant to be used from the event loop only.
+    """
+
+    def __init__(self, window: int = 20, min_calls: int = 5, failure_ratio: float = 0.5,
+                 slow_call_seconds: float = 8.0, open_seconds: float = 30.0):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.rejected = 0
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True for a bad call
+        self._opened_at: float | None = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def check(self) -> None:
+        """Raise CircuitOpenError while calls are rejected, without claiming the half-open probe"""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probe_in_flight):
+            self.rejected += 1
+            raise CircuitOpenError()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        async with self.guard():
+            return await fn()
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """Count the block as one call, for upstream work that is not a single awaitable such as a stream"""
+        self.check()
+        probe = self.state == "half_open"
+        if probe:
+            self._probe_in_flight = True
+
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self._record(probe, True)
+            raise
+        except BaseException:
+            # cancelled or closed by the caller, which says nothing about the upstream
+            if probe:
+                self._probe_in_flight = False
+            raise
+        self._record(probe, time.monotonic() - started >= self.slow_call_seconds)
+
+    def _record(self, probe: bool, bad: bool) -> None:
+        if probe:
+            self._probe_in_flight = False
+            if bad:
+                self._opened_at = time.monotonic()
+            else:
+                self._opened_at = None
+                self._outcomes.clear()
+            return
+        if self._opened_at is not None:
+            # a call that started before the circuit opened, the probe decides what happens next
+            return
+        self._outcomes.append(bad)
+        if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_ratio:
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "recent_calls": calls,
+            "recent_bad_ratio": sum(self._outcomes) / calls if calls else 0.0,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from starlette import status
+
+# Clients may keep a response but must revalidate it, which costs a bodiless 304 while nothing changed
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands stored timestamps back naive, they are UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def row_version(updated_at: datetime) -> int:
+    """Microseconds since the epoch, changes with every write to the row"""
+    return (_as_utc(updated_at) - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(microseconds=1)
+
+
+def make_etag(*parts: object) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def validator_headers(etag: str, last_modified: datetime | None = None,
+                      cache_control: str = REVALIDATE_CACHE_CONTROL) -> dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None = None) -> bool:
+    """
+    Evaluate If-None-Match, or If-Modified-Since when there is no If-None-Match, as in RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = _as_utc(parsedate_to_datetime(if_modified_since))
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have whole seconds
+    return _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def not_modified(headers: dict[str, str]) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -0,0 +1,30 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+from starlette import status
+
+# Keyset pages return the cursor for the following page in this header, so list bodies keep their shape
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(**values: int | float) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, *keys: str) -> tuple[int | float, ...]:
+    """
+    Decode an opaque cursor made by encode_cursor and return the values of keys in order.
+    Raise 400 when the cursor is malformed or does not carry those keys.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        result = tuple(values[key] for key in keys)
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in result):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return result
@@ -0,0 +1,196 @@
+import functools
+import inspect
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Count and time the SQL statements of every request and report them with the other phases in a
+# Server-Timing header
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "1").lower() in ("1", "true", "yes")
+# Warn about a request that runs the same statement this many times, the mark of a lazy load in a loop;
+# 0 turns the warning off
+QUERY_REPEAT_WARNING = int(os.getenv("QUERY_REPEAT_WARNING", 3))
+# Phases besides db reported in Server-Timing, in this order, when a request spent time in them
+TIMED_PHASES = ("auth", "serialization", "llm")
+
+_current: ContextVar["RequestMetrics | None"] = ContextVar("request_metrics", default=None)
+# Request lists of the active max_queries blocks. A plain list rather than a context variable, because
+# TestClient serves requests on another thread than the test that sends them.
+_captures: list[list["RequestMetrics"]] = []
+
+
+class RequestMetrics:
+    """SQL statements and time per phase of one request, or of one max_queries block"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.phases: dict[str, float] = {}
+        # single statements by SQL text; executemany batches are counted but cannot be an N+1
+        self.statements: Counter[str] = Counter()
+        self.endpoint_done: float | None = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def record_query(self, statement: str, seconds: float, executemany: bool) -> None:
+        self.queries += 1
+        self.add("db", seconds)
+        if not executemany:
+            self.statements[statement] += 1
+
+    def repeated(self, times: int) -> list[tuple[str, int]]:
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= times]
+
+    def server_timing(self) -> str:
+        entries = [f'db;dur={self.phases.get("db", 0.0) * 1000:.1f};desc="{self.queries} queries"']
+        entries += [f"{phase};dur={self.phases[phase] * 1000:.1f}" for phase in TIMED_PHASES if phase in self.phases]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+    def describe(self) -> str:
+        lines = [f"{self.label}: {self.queries} queries"]
+        lines += [f"  {count}x {' '.join(statement.split())[:200]}" for statement, count in self.statements.most_common()]
+        return "\n".join(lines)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Add the time spent in the block to the current request's phase, a no-op outside a request"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(phase, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    metrics = _current.get()
+    if metrics is not None and conn.info.get("query_started"):
+        metrics.record_query(statement, time.perf_counter() - conn.info["query_started"].pop(), executemany)
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that notes when the endpoint returned, so the time FastAPI then spends validating and encoding
+    the response model is reported as serialization
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        # include_router builds its routes again from these, already wrapped, endpoints
+        if not getattr(endpoint, "_timed", False):
+            endpoint = _mark_endpoint_done(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _mark_endpoint_done(endpoint):
+    def done() -> None:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.endpoint_done = time.perf_counter()
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            response = await endpoint(*args, **kwargs)
+            done()
+            return response
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            response = endpoint(*args, **kwargs)
+            done()
+            return response
+    wrapper._timed = True
+    return wrapper
+
+
+class ServerTimingMiddleware:
+    """
+    Collect the metrics of every HTTP request, add them to the response as a Server-Timing header and warn
+    about statements the request repeated.
+
+    The header is sent with the response start, so a streamed response reports the work done until then.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not REQUEST_METRICS:
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                if metrics.endpoint_done is not None:
+                    metrics.add("serialization", time.perf_counter() - metrics.endpoint_done)
+                MutableHeaders(scope=message).append("Server-Timing", metrics.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            metrics.label = f"{scope['method']} {route.path if route is not None else scope['path']}"
+            _finish(metrics)
+
+
+def _finish(metrics: RequestMetrics) -> None:
+    if QUERY_REPEAT_WARNING:
+        for statement, count in metrics.repeated(QUERY_REPEAT_WARNING):
+            print(f"Repeated query warning: {metrics.label} ran {count}x {' '.join(statement.split())[:200]}")
+    for requests in _captures:
+        requests.append(metrics)
+
+
+@contextmanager
+def max_queries(limit: int) -> Iterator[list[RequestMetrics]]:
+    """
+    Fail with AssertionError if a request served inside the block issued more than limit SQL statements:
+
+        with max_queries(2):
+            client.get("/evidence_problem/is_solved_by_user", params={"problem_id": 1}, headers=auth)
+
+    Statements run directly in the block, outside any request, are checked as one more request.
+    Yields the list the requests' metrics are collected in.
+    """
+    requests: list[RequestMetrics] = []
+    block = RequestMetrics("block")
+    _captures.append(requests)
+    token = _current.set(block)
+    try:
+        yield requests
+    finally:
+        _current.reset(token)
+        _captures.remove(requests)
+    if block.queries:
+        requests.append(block)
+    over = [metrics for metrics in requests if metrics.queries > limit]
+    if over:
+        raise AssertionError(f"More than {limit} queries:\n" + "\n".join(metrics.describe() for metrics in over))
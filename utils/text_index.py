@@ -0,0 +1,56 @@
+import re
+from bisect import bisect_left, bisect_right
+
+
+def needle_pattern(needle: str) -> re.Pattern | None:
+    """Pattern matching needle regardless of case and of how its words are spaced or broken over lines"""
+    words = needle.split()
+    if not words:
+        return None
+    return re.compile(r"\s+".join(map(re.escape, words)), re.IGNORECASE)
+
+
+def find_occurrences(text: str, needle: str) -> list[list[int]]:
+    """[start, end] offsets of every non-overlapping occurrence of needle in text, see needle_pattern"""
+    pattern = needle_pattern(needle)
+    if pattern is None or not text:
+        return []
+    return [list(match.span()) for match in pattern.finditer(text)]
+
+
+# A word, keeping apostrophes and hyphens inside it: "don't" and "well-known" are one token
+_TOKEN = re.compile(r"\w+(?:['’-]\w+)*")
+
+
+def tokenize(text: str) -> list[tuple[int, int, str]]:
+    """(start, end, casefolded token) of every token of text"""
+    return [(match.start(), match.end(), match.group().casefold()) for match in _TOKEN.finditer(text)]
+
+
+def token_offsets(text: str) -> dict:
+    """Start and end offsets of every token of text, what token_range bisects"""
+    tokens = tokenize(text)
+    return {
+        "starts": [start for start, _, _ in tokens],
+        "ends": [end for _, end, _ in tokens],
+    }
+
+
+def find_token_range(text: str, needle: str) -> list[int] | None:
+    """
+    [first, last) tokens of the first occurrence of needle in text, compared token by token so case, spacing
+    and punctuation do not matter. None when needle does not occur.
+    """
+    wanted = [token for _, _, token in tokenize(needle)]
+    if not wanted:
+        return None
+    words = [token for _, _, token in tokenize(text)]
+    for first in range(len(words) - len(wanted) + 1):
+        if words[first] == wanted[0] and words[first:first + len(wanted)] == wanted:
+            return [first, first + len(wanted)]
+    return None
+
+
+def token_range(offsets: dict, start: int, end: int) -> tuple[int, int]:
+    """[first, last) tokens of token_offsets that the character span [start, end) touches"""
+    return bisect_right(offsets["ends"], start), bisect_left(offsets["starts"], end)